@@ -0,0 +1,65 @@
+"""
+多頁合併請求的 pages/min 與每頁 token 比較
+
+    python benchmarks/bench_batch.py input/xxx.pdf 頁數 模型名稱 [K1 K2 ...]
+
+使用 API_key.txt 的 key 實際呼叫模型，不使用快取，預設比較 K = 1 2 4 8。
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf2image import convert_from_path
+from image_encoding import load_profile
+from load_content_manager import APIKeyManager
+from key_pool import KeyPool, KeySlot, mask_key
+from model_router import ModelTier
+from ocr_backend import GeminiBackend
+from ocr_cache import OCRCache
+from process_main import TokenUsage, ocr_batch, ocr_page, poppler_dir, read_conf, read_prompt
+from rate_limiter import build_limiter
+from run_report import RunReport
+
+if __name__ == "__main__":
+    pdf_path, n_pages, model_name = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+    ks = [int(k) for k in sys.argv[4:]] or [1, 2, 4, 8]
+    config = read_conf(os.path.join("setting", "conf.txt")) or {}
+    pages = convert_from_path(pdf_path, dpi=200, poppler_path=poppler_dir(config),
+                              first_page=1, last_page=n_pages)
+    api_keys = APIKeyManager().read_keys() or [""]
+    prompt = read_prompt(os.path.join("setting", "mainprompt.txt"), 1)
+    workers = int(config.get("ocr_workers", 4)) * len(api_keys)
+
+    for k in ks:
+        with tempfile.TemporaryDirectory() as tmp:
+            ctx = {
+                "tiers": [ModelTier(model_name, KeyPool([
+                    KeySlot(mask_key(key), GeminiBackend(key, model_name),
+                            build_limiter(model_name, os.path.join("setting", "ratelimit.txt"), api_key=key))
+                    for key in api_keys]))],
+                "model_name": model_name,
+                # an empty cache per K so every run pays for its requests
+                "cache": OCRCache(os.path.join(tmp, "cache")),
+                "encoding": load_profile(config),
+                "prompt": prompt,
+                "prompt_in_request": True,
+                "generate_Img": False,
+                "mask_figures": False,
+                "usage": TokenUsage(),
+                "report": RunReport(model_name),
+            }
+            batches = [list(enumerate(pages[s:s + k], start=s + 1)) for s in range(0, len(pages), k)]
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                if k == 1:
+                    results = list(executor.map(lambda b: [ocr_page(ctx, b[0][1], "bench", b[0][0])], batches))
+                else:
+                    results = list(executor.map(lambda b: ocr_batch(ctx, b, "bench"), batches))
+            elapsed = time.perf_counter() - start
+        ok = sum(r["ok"] for batch in results for r in batch)
+        print(f"K={k:<2} {len(pages) / elapsed * 60:7.1f} pages/min  "
+              f"{ctx['usage'].describe_since((0, 0, 0), len(pages))}  成功 {ok}/{len(pages)}")
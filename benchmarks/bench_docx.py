@@ -0,0 +1,63 @@
+"""
+docx 輸出速度與檔案大小比較：每字元一個 run (舊版) vs 合併 run (docx_writer)
+
+    python benchmarks/bench_docx.py [頁數]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from docx import Document
+from docx.shared import Pt
+from docx.oxml.ns import qn
+from docx_writer import build_docx, contains_chinese
+
+SAMPLE_PAGE = """1. 設 f(x)=x^2+3x-4，若 $\\frac{f(a)}{a-1}$=5，則 a 之值為何？
+(A) 1 (B) 2 (C) 3 (D) 4
+2. 已知 log_10 2≈0.3010，求 2^50 為幾位數？
+∵ log_10 2^50=50×0.3010=15.05 ∴ 2^50 為 16 位數
+3. △ABC 中，$\\overline{AB}$=$\\overline{AC}$，∠A=40°，求 ∠B 的度數。選( )
+"""
+
+
+def build_docx_per_char(texts, output_file):
+    """舊版寫法：每個字元各自一個 run"""
+    doc = Document()
+    for line in "".join(f"{text}\n\n" for text in texts).splitlines():
+        if not line:
+            doc.add_paragraph("")
+            continue
+        p = doc.add_paragraph()
+        for char in line:
+            run = p.add_run(char)
+            if contains_chinese(char):
+                run.font.name = "標楷體"
+                run._element.rPr.rFonts.set(qn("w:eastAsia"), "標楷體")
+            else:
+                run.font.name = "Times New Roman"
+                run._element.rPr.rFonts.set(qn("w:eastAsia"), "Times New Roman")
+                if char.isalpha():
+                    run.italic = True
+            run.font.size = Pt(12)
+    doc.save(output_file)
+
+
+def measure(builder, texts, output_file):
+    start = time.perf_counter()
+    builder(texts, output_file)
+    return time.perf_counter() - start, os.path.getsize(output_file)
+
+
+if __name__ == "__main__":
+    n_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    texts = [SAMPLE_PAGE * 3] * n_pages
+    with tempfile.TemporaryDirectory() as tmp:
+        old_t, old_size = measure(build_docx_per_char, texts, os.path.join(tmp, "old.docx"))
+        new_t, new_size = measure(build_docx, texts, os.path.join(tmp, "new.docx"))
+    print(f"{n_pages} 頁")
+    print(f"per-char runs : {old_t:7.2f} s  {old_size / 1024:8.0f} KB")
+    print(f"merged runs   : {new_t:7.2f} s  {new_size / 1024:8.0f} KB")
+    print(f"speedup x{old_t / new_t:.1f}, size x{old_size / new_size:.1f} smaller")
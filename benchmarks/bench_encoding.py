@@ -0,0 +1,78 @@
+"""
+上傳圖片編碼設定的 大小 / 編碼時間 / 辨識準確度 比較
+
+    python benchmarks/bench_encoding.py input/xxx.pdf [頁數] [--ocr 模型名稱]
+
+不加 --ocr 時只比較每頁平均大小與編碼時間；加上 --ocr 會用 API_key.txt 的 key
+實際辨識，並以 png 原尺寸的結果為基準計算文字相似度 (difflib ratio)。
+"""
+import difflib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from pdf2image import convert_from_path
+from image_encoding import DEFAULT_PROFILE, describe, encode_page
+from load_content_manager import APIKeyManager
+from process_main import poppler_dir, read_conf, read_prompt
+
+PROFILES = [
+    {},
+    {"long_edge": 2048},
+    {"format": "png", "mode": "gray", "long_edge": 2048},
+    {"format": "png", "mode": "binary", "long_edge": 2048},
+    {"format": "jpeg", "quality": 85, "mode": "gray", "long_edge": 2048},
+    {"format": "jpeg", "quality": 70, "mode": "gray", "long_edge": 1536},
+    {"format": "webp", "quality": 80, "mode": "gray", "long_edge": 2048},
+]
+
+
+def load_pages(path, n_pages):
+    if path.lower().endswith(".pdf"):
+        config = read_conf(os.path.join("setting", "conf.txt")) or {}
+        return convert_from_path(path, dpi=200, poppler_path=poppler_dir(config),
+                                 first_page=1, last_page=n_pages)
+    return [Image.open(path).convert("RGB")]
+
+
+def ocr(model, prompt, data, mime_type):
+    response = model.generate_content([{"mime_type": mime_type, "data": data}, {"text": prompt}])
+    return response.text.strip() if getattr(response, "text", None) else ""
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    model = None
+    if "--ocr" in args:
+        k = args.index("--ocr")
+        model_name = args[k + 1]
+        del args[k:k + 2]
+        import google.generativeai as genai
+        genai.configure(api_key=next(iter(APIKeyManager().read_keys()), ""))
+        model = genai.GenerativeModel(model_name)
+        prompt = read_prompt(os.path.join("setting", "mainprompt.txt"), 1)
+
+    pages = load_pages(args[0], int(args[1]) if len(args) > 1 else 5)
+    baseline = None
+    print(f"{len(pages)} 頁")
+    for overrides in PROFILES:
+        profile = dict(DEFAULT_PROFILE, **overrides)
+        total_bytes = 0
+        encode_time = 0.0
+        texts = []
+        for img in pages:
+            start = time.perf_counter()
+            data, mime_type, _ = encode_page(img, profile)
+            encode_time += time.perf_counter() - start
+            total_bytes += len(data)
+            if model is not None:
+                texts.append(ocr(model, prompt, data, mime_type))
+        line = f"{describe(profile):<28} {total_bytes / len(pages) / 1024:8.0f} KB/頁  {encode_time / len(pages) * 1000:7.1f} ms/頁"
+        if model is not None:
+            baseline = baseline or texts
+            ratio = sum(difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(baseline, texts)) / len(texts)
+            line += f"  相似度 {ratio:.3f}"
+        print(line)
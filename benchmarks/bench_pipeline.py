@@ -0,0 +1,216 @@
+"""
+PDF → DOCX 整條流程的效能測試 (使用 FakeBackend，不花費配額)
+
+    python benchmarks/bench_pipeline.py [--pages 10 100 500] [--pdf input/xxx.pdf ...]
+                                        [--synthetic pdf|images] [--latency 0.5]
+                                        [--out result.json] [--compare old.json]
+
+每個 (來源, 頁數) 組合在獨立的子行程與暫存工作目錄中，以 ocr_backend: fake 執行 process_mainflow，
+各階段時間取自 RunReport (各頁合計)：
+render_s   轉圖片 (等待 rasterizer 的時間)
+encode_s   上傳圖片編碼
+request_s  模型請求本身 (各次嘗試合計，不含等待限流與重試前的等待)
+figures_s  extract_figures
+docx_s     build_docx
+total_s / pages_per_min / peak_rss_mb
+結果寫成 JSON；加上 --compare 時與舊結果比較，任一項慢 15% 以上就以 exit code 1 結束。
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from PIL import Image, ImageDraw, ImageFont
+
+STAGES = ["render_s", "encode_s", "request_s", "figures_s", "docx_s", "total_s"]
+REGRESSION_RATIO = 1.15
+
+
+def synthetic_page(n):
+    """A4 200dpi 的題目頁：幾行文字加上一張圖"""
+    img = Image.new("RGB", (1654, 2339), "white")
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=36)
+    for k, y in enumerate(range(180, 1300, 56)):
+        draw.text((150, y), f"{n}-{k}. f(x)=x^2+{k}x-{n}  find f({k})  (A) {k} (B) {n} (C) {k + n}", fill="black", font=font)
+    draw.rectangle([300, 1400, 1300, 2100], outline="black", width=4)
+    draw.ellipse([500, 1500, 1100, 2000], outline="black", width=4)
+    return img
+
+
+def make_synthetic_pdf(path, n_pages):
+    first = synthetic_page(1)
+    first.save(path, save_all=True, resolution=200,
+               append_images=(synthetic_page(n) for n in range(2, n_pages + 1)))
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    self_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1 / 1024 / 1024 if sys.platform == "darwin" else 1 / 1024
+    return round(max(self_kb, child_kb) * scale, 1)
+
+
+def write_conf(path, overrides):
+    """複製 conf.txt，以 overrides 取代或補上對應的設定"""
+    with open(os.path.join(ROOT, "setting", "conf.txt"), "r", encoding="utf-8") as f:
+        lines = [line.rstrip("\n") + "\n" for line in f if line.split(":", 1)[0].strip() not in overrides]
+    lines += [f"{key}: {value}\n" for key, value in overrides.items()]
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+
+def run_scenario(source, n_pages, latency, workers):
+    """
+    在暫存的工作目錄中以 ocr_backend: fake 跑一次 process_mainflow，回傳各階段時間
+    空白 / 重複頁過濾、快取、journal、多頁請求與切段都走正式的流程
+    """
+    from process_main import process_mainflow
+    from run_report import RunReport
+
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    shutil.copytree(os.path.join(ROOT, "setting"), os.path.join(tmp, "setting"))
+    write_conf(os.path.join(tmp, "setting", "conf.txt"), {
+        "ocr_backend": "fake",
+        "backend_record": "off",
+        "fake_latency_s": latency,
+        "fake_error_rate": 0.0,
+        "ocr_workers": workers,
+    })
+    # the fake model must not be throttled by the free-tier defaults
+    with open(os.path.join(tmp, "setting", "ratelimit.txt"), "a", encoding="utf-8") as f:
+        f.write("\nbench: 100000, 1000000000\n")
+    input_dir = os.path.join(tmp, "input")
+    os.makedirs(input_dir)
+    images = source == "synthetic-images"
+    ranges = {}
+    if images:
+        for n in range(1, n_pages + 1):
+            synthetic_page(n).save(os.path.join(input_dir, f"page_{n:04d}.png"))
+    elif source == "synthetic-pdf":
+        make_synthetic_pdf(os.path.join(input_dir, "synthetic.pdf"), n_pages)
+        ranges["synthetic.pdf"] = (1, n_pages)
+    else:
+        shutil.copy(source, input_dir)
+        ranges[os.path.basename(source)] = (1, n_pages)
+
+    options = {
+        "transcribe": images,
+        "black_frame": False,
+        "crop": True,
+        "slowdown": False,
+        "resume": False,
+        "input_dir": input_dir,
+        "output_dir": os.path.join(tmp, "output"),
+        "open_output": False,
+    }
+    report = RunReport("bench")
+    # setting/ and the OCR cache are relative to the working directory; a fresh one means no cache hits
+    os.chdir(tmp)
+    start = time.perf_counter()
+    ok = process_mainflow("bench-key", ranges, options, 10000, 60, "", "bench", report=report)
+    total = time.perf_counter() - start
+    if not ok:
+        raise RuntimeError("process_mainflow failed")
+
+    stats = report.summary()
+    timings = {stage: stats.get(stage, {}).get("total", 0.0) for stage in STAGES}
+    timings["docx_s"] = sum(f.get("docx_s", 0.0) for f in report.files.values())
+    timings["total_s"] = total
+    result = {k: round(v, 3) for k, v in timings.items()}
+    result["pages"] = len(report.pages)
+    result["failed"] = len(report.failed_pages())
+    result["pages_per_min"] = round(result["pages"] / total * 60, 1) if total else 0.0
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["source"], r["pages"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        old = baseline.get((r["source"], r["pages"]))
+        if old is None or "error" in r or "error" in old:
+            continue
+        for key in STAGES + ["peak_rss_mb"]:
+            if old.get(key) and r.get(key) and r[key] > old[key] * REGRESSION_RATIO and r[key] - old[key] > 0.05:
+                regressions.append(f"{os.path.basename(r['source'])} {r['pages']}p {key}: {old[key]} → {r[key]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--pdf", nargs="*", default=[])
+    parser.add_argument("--synthetic", choices=["pdf", "images", "none"], default="pdf")
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--compare", default=None)
+    parser.add_argument("--single", nargs=2, metavar=("SOURCE", "PAGES"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        result = run_scenario(args.single[0], int(args.single[1]), args.latency, args.workers)
+        print(json.dumps(result))
+        return 0
+
+    sources = [os.path.abspath(p) for p in args.pdf]
+    if args.synthetic != "none":
+        sources.insert(0, f"synthetic-{args.synthetic}")
+
+    results = []
+    for source in sources:
+        for n_pages in args.pages:
+            if not source.startswith("synthetic-"):
+                from PyPDF2 import PdfReader
+                n_pages = min(n_pages, len(PdfReader(source).pages))
+            # a fresh process per scenario so peak RSS belongs to that scenario alone
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--single", source, str(n_pages),
+                 "--latency", str(args.latency), "--workers", str(args.workers)],
+                capture_output=True, text=True, cwd=ROOT,
+            )
+            entry = {"source": source if source.startswith("synthetic-") else os.path.basename(source)}
+            try:
+                entry.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+            except (IndexError, ValueError):
+                entry.update({"pages": n_pages, "error": proc.stderr.strip().splitlines()[-1:] or ["unknown"]})
+            results.append(entry)
+            print(json.dumps(entry, ensure_ascii=False))
+
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "latency_s": args.latency,
+        "workers": args.workers,
+        "results": results,
+    }
+    out = args.out or os.path.join(ROOT, "benchmarks", f"results-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {out}")
+
+    if args.compare:
+        regressions = compare(results, args.compare)
+        for line in regressions:
+            print(f"❌ 效能退步 {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
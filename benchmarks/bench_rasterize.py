@@ -0,0 +1,51 @@
+"""
+PDF 轉圖片的平行度測試
+
+    python benchmarks/bench_rasterize.py input/xxx.pdf [頁數] [chunk 大小]
+
+依序以 1, 2, 4 ... 到 CPU 核心數個 process 轉同一段頁面，印出每種設定的 pages/sec。
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyPDF2 import PdfReader
+from process_main import poppler_dir, read_conf
+from rasterizer import ParallelRasterizer
+
+
+def bench(pdf_path, pages, processes, chunk_size, poppler_path):
+    rasterizer = ParallelRasterizer(poppler_path, processes=processes, chunk_size=chunk_size)
+    start = time.perf_counter()
+    try:
+        rasterizer.add(pdf_path, pages)
+        count = sum(1 for _ in rasterizer.iter_pages(pdf_path, pages))
+    finally:
+        rasterizer.close()
+    return count, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    pdf_path = sys.argv[1]
+    total = len(PdfReader(pdf_path).pages)
+    n_pages = min(int(sys.argv[2]), total) if len(sys.argv) > 2 else total
+    chunk_size = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+    config = read_conf(os.path.join("setting", "conf.txt")) or {}
+    poppler_path = poppler_dir(config)
+
+    pages = list(range(1, n_pages + 1))
+    process_counts = []
+    n = 1
+    while n < (os.cpu_count() or 1):
+        process_counts.append(n)
+        n *= 2
+    process_counts.append(os.cpu_count() or 1)
+
+    print(f"{os.path.basename(pdf_path)}: {n_pages} 頁, chunk={chunk_size}")
+    baseline = None
+    for processes in process_counts:
+        count, elapsed = bench(pdf_path, pages, processes, chunk_size, poppler_path)
+        baseline = baseline or elapsed
+        print(f"processes={processes:>2}  {elapsed:7.2f} s  {count / elapsed:6.2f} pages/s  speedup x{baseline / elapsed:.2f}")
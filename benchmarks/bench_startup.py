@@ -0,0 +1,83 @@
+"""
+視窗啟動時間測試
+
+    python benchmarks/bench_startup.py [--runs 5] [--top 15]
+
+1. python -X importtime -c "import ui_main"：import ui_main 的累計時間與最慢的幾個模組
+2. 從啟動子行程到 MainWindow.show() 完成的時間 (QT_QPA_PLATFORM=offscreen，不會真的開視窗)
+每項都在新的子行程中量 runs 次，取中位數。
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_WINDOW = """
+import sys, time
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+import ui_main
+window = ui_main.MainWindow()
+window.show()
+app.processEvents()
+# MainWindow redirects sys.stdout into the log box
+sys.__stdout__.write(str(time.time()) + "\\n")
+"""
+
+
+def import_times():
+    """回傳 {模組: 累計微秒}"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import ui_main"],
+                          capture_output=True, text=True, cwd=ROOT)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def first_window_seconds():
+    """啟動子行程到視窗顯示的秒數"""
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    start = time.time()
+    proc = subprocess.run([sys.executable, "-c", FIRST_WINDOW],
+                          capture_output=True, text=True, cwd=ROOT, env=env)
+    try:
+        return float(proc.stdout.strip().splitlines()[-1]) - start
+    except (IndexError, ValueError):
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1:] or "unknown error")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [import_times() for _ in range(args.runs)]
+    total = statistics.median(r.get("ui_main", 0) for r in runs) / 1000
+    print(f"import ui_main: {total:.0f} ms (中位數, {args.runs} 次)")
+    last = runs[-1]
+    for name, us in sorted(last.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"   {us / 1000:8.1f} ms  {name}")
+
+    heavy = ["process_main", "google.generativeai", "cv2", "numpy", "pdf2image", "docx"]
+    loaded = [m for m in heavy if m in last]
+    print("啟動時載入的重型套件: " + (", ".join(loaded) if loaded else "無"))
+
+    try:
+        window = statistics.median(first_window_seconds() for _ in range(args.runs))
+        print(f"到視窗顯示: {window * 1000:.0f} ms (中位數, {args.runs} 次)")
+    except RuntimeError as e:
+        print(f"⚠️ 無法量測視窗顯示時間: {e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
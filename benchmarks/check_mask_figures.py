@@ -0,0 +1,71 @@
+"""
+遮蔽圖片的檢查：有框線的文字 (表格、框起來的題目) 不能被塗白
+
+    python benchmarks/check_mask_figures.py
+
+以 200 dpi A4 合成頁面，包含一般文字、有框線的文字表格與一張函數圖，
+確認表格內的墨跡在上傳的圖中保留、函數圖被遮蔽。判斷錯誤時以 exit code 1 結束。
+"""
+import math
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from process_main import mask_figures
+from run_report import RunReport
+
+TABLE = (150, 700, 1500, 1200)
+PLOT = (400, 1500, 1250, 2150)
+
+
+def page():
+    img = Image.new("RGB", (1654, 2339), "white")
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=36)
+    for k in range(6):
+        draw.text((150, 150 + k * 60), f"{k + 1}. Solve the equation 2x + {k} = {k + 6} and explain.", fill="black", font=font)
+    # bordered table of text rows
+    x0, y0, x1, y1 = TABLE
+    draw.rectangle(TABLE, outline="black", width=3)
+    for row in range(1, 5):
+        draw.line((x0, y0 + row * 100, x1, y0 + row * 100), fill="black", width=2)
+    for row in range(5):
+        draw.text((x0 + 30, y0 + 30 + row * 100), f"Item {row + 1}   price {row * 7 + 3} dollars   qty {row + 2}",
+                  fill="black", font=font)
+    # a function plot: axes, a curve and a few tick labels
+    x0, y0, x1, y1 = PLOT
+    draw.line((x0, (y0 + y1) // 2, x1, (y0 + y1) // 2), fill="black", width=4)
+    draw.line(((x0 + x1) // 2, y0, (x0 + x1) // 2, y1), fill="black", width=4)
+    curve = [(x, (y0 + y1) / 2 - 250 * math.sin((x - x0) / 70)) for x in range(x0, x1, 4)]
+    draw.line(curve, fill="black", width=6)
+    draw.ellipse((x0 + 100, y0 + 50, x0 + 400, y0 + 250), outline="black", width=5)
+    for n, label in enumerate("xyO"):
+        draw.text((x1 - 40 + n * 5, (y0 + y1) // 2 + 10 + n * 40), label, fill="black", font=font)
+    return img
+
+
+def ink(img, box):
+    return int((np.array(img.crop(box).convert("L")) < 160).sum())
+
+
+if __name__ == "__main__":
+    img = page()
+    with tempfile.TemporaryDirectory() as out, ThreadPoolExecutor(max_workers=1) as writer:
+        ctx = {"mask_figures": True, "generate_Img": True, "output_dir": out, "min_area": 10000,
+               "paddling": 60, "figure_writer": writer, "report": RunReport("check")}
+        upload, figures = mask_figures(ctx, img, "check", 1)
+    failed = 0
+    kept = ink(upload, TABLE) / ink(img, TABLE)
+    ok = kept > 0.95
+    failed += not ok
+    print(f"{'✅' if ok else '❌'} 表格內的墨跡保留 {kept:.0%}")
+    kept = ink(upload, PLOT) / ink(img, PLOT)
+    ok = kept < 0.2
+    failed += not ok
+    print(f"{'✅' if ok else '❌'} 函數圖的墨跡剩下 {kept:.0%} (遮蔽 {len(figures)} 張)")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,81 @@
+"""
+空白頁與重複頁判斷的檢查：只差一個答案的頁面不能被當成重複頁，只有幾個字的頁面不能被當成空白頁
+
+    python benchmarks/check_page_filter.py
+
+以 200 dpi A4 合成題目頁，每組只改一個字元；另外確認完全相同的頁面仍判為重複，
+只有 "x = 3" 或 "5." 的頁面不是空白頁，全白或只有掃描污點的頁面是空白頁。
+有任何一組判斷錯誤時以 exit code 1 結束。
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+from page_filter import PageFilter
+
+PAIRS = [
+    ("Answer: (A)", "Answer: (B)"),
+    ("x = 3", "x = 8"),
+    ("x = 12", "x = 17"),
+]
+
+
+SPARSE = ["x = 3", "5."]
+
+
+def sparse_page(text):
+    img = Image.new("RGB", (1654, 2339), "white")
+    if text:
+        ImageDraw.Draw(img).text((150, 150), text, fill="black", font=ImageFont.load_default(size=36))
+    return img
+
+
+def dusty_page():
+    img = Image.new("RGB", (1654, 2339), "white")
+    draw = ImageDraw.Draw(img)
+    for k in range(8):
+        draw.point((300 + k * 150, 400 + k * 200), fill="black")
+    return img
+
+
+def page(answer):
+    img = Image.new("RGB", (1654, 2339), "white")
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=36)
+    for k in range(20):
+        draw.text((150, 150 + k * 60), f"{k + 1}. Solve the equation 2x + {k} = {k + 6} and explain.", fill="black", font=font)
+    draw.text((150, 1500), answer, fill="black", font=font)
+    return img
+
+
+def judge(a, b):
+    page_filter = PageFilter()
+    kind, _, signature = page_filter.check(a)
+    page_filter.remember(signature, None)
+    return page_filter.check(b)[0]
+
+
+if __name__ == "__main__":
+    failed = 0
+    for left, right in PAIRS:
+        kind = judge(page(left), page(right))
+        ok = kind == "new"
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} {left!r} vs {right!r}: {kind}")
+    kind = judge(page(PAIRS[0][0]), page(PAIRS[0][0]))
+    ok = kind == "duplicate"
+    failed += not ok
+    print(f"{'✅' if ok else '❌'} 相同頁面: {kind}")
+    for text in SPARSE:
+        kind = PageFilter().check(sparse_page(text))[0]
+        ok = kind == "new"
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} 只有 {text!r} 的頁面: {kind}")
+    for name, img in (("全白頁面", sparse_page("")), ("只有污點的頁面", dusty_page())):
+        kind = PageFilter().check(img)[0]
+        ok = kind == "blank"
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} {name}: {kind}")
+    sys.exit(1 if failed else 0)
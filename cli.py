@@ -0,0 +1,250 @@
+"""
+不開啟視窗的批次執行入口 (不 import PyQt)，可在 Linux 主機或排程中使用
+
+    python cli.py --model gemini-2.5-flash --input in_dir --output out_dir
+                  [--pages a.pdf=1-5 --pages b.pdf=3-3] [--crop] [--resume] ...
+
+API key 依序取自 --api-key、環境變數 GEMINI_API_KEY、API_key.txt；
+多把 key 以逗號分隔 (API_key.txt 為每行一把)，請求會分散到各 key 的配額
+沒有指定 --pages 的 PDF 會處理全部頁面
+
+exit code:
+    0  全部完成
+    1  執行失敗 (找不到輸入、沒有 API key、轉檔失敗或未預期的錯誤)
+    2  參數錯誤
+    3  部分頁面辨識失敗，可加 --resume 重跑只補做失敗的頁面
+    130 使用者中斷
+
+--watch 時持續監看輸入資料夾，只處理新增或內容變更的檔案 (頁碼範圍同上)，
+直到 Ctrl+C 才結束
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import traceback
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_PARTIAL = 3
+EXIT_INTERRUPTED = 130
+
+
+def parse_range(text, pages=None):
+    """把 "3-8" / "5" / "all" 轉成 (start, end)，pages 為該檔總頁數"""
+    text = text.strip().lower()
+    if text == "all":
+        if not pages:
+            raise ValueError("無法讀取頁數")
+        return 1, pages
+    start, _, end = text.partition("-")
+    start = int(start)
+    end = int(end) if end else start
+    if not (1 <= start <= end) or (pages and end > pages):
+        raise ValueError(f"頁碼範圍錯誤: {text}")
+    return start, end
+
+
+def build_page_ranges(input_dir, specs, default_range, only=None):
+    """
+    回傳 process_mainflow 使用的 {pdf 檔名: (start, end)}
+    specs 為 ["a.pdf=1-5", ...]；沒列出的 PDF 使用 default_range ("all" 或 "none" 表示略過)
+    only 不為 None 時只處理其中的 PDF，specs 中不在 input 的檔名不視為錯誤
+    """
+    from pdf_loader import PDFLoader
+
+    loader = PDFLoader(input_dir)
+    pdfs = loader.list_pdfs()
+    if only is not None:
+        pdfs = [f for f in pdfs if f in only]
+    counts = {f: loader.cached_pages(f) for f in pdfs}
+    counts.update(loader.iter_page_counts([f for f, pages in counts.items() if pages is None]))
+    explicit = {}
+    for spec in specs:
+        name, sep, pages = spec.rpartition("=")
+        if not sep:
+            raise ValueError(f"--pages 格式應為 檔名=起-迄: {spec}")
+        if name not in counts and only is None:
+            raise ValueError(f"input 中找不到 {name}")
+        explicit[name] = pages
+
+    ranges = {}
+    for name, total in sorted(counts.items()):
+        spec = explicit.get(name, default_range)
+        if spec.lower() == "none":
+            continue
+        ranges[name] = parse_range(spec, total)
+    return ranges
+
+
+def read_api_key(args):
+    if args.api_key:
+        return args.api_key.strip()
+    if os.environ.get("GEMINI_API_KEY"):
+        return os.environ["GEMINI_API_KEY"].strip()
+    from load_content_manager import APIKeyManager
+
+    return APIKeyManager(os.path.join(ROOT, "API_key.txt")).read_key()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="PDF / 圖片批次轉 Word (不開啟視窗)")
+    parser.add_argument("--model", required=True, help="模型名稱，例如 gemini-2.5-flash")
+    parser.add_argument("--input", default="input", help="輸入資料夾 (預設 input)")
+    parser.add_argument("--output", default="output", help="輸出資料夾 (預設 output)")
+    parser.add_argument("--pages", action="append", default=[], metavar="FILE=START-END",
+                        help="指定 PDF 的頁碼範圍，可重複使用")
+    parser.add_argument("--default-pages", default="all",
+                        help="沒有指定 --pages 的 PDF：all (預設) 或 none (略過)")
+    parser.add_argument("--api-key", default=None, help="多把 key 以逗號分隔")
+    parser.add_argument("--prompt", default="", help="附加在主要 prompt 後的額外指示")
+    parser.add_argument("--prompt-file", default=None, help="從檔案讀取額外指示")
+    parser.add_argument("--no-images", action="store_true", help="不處理 input 中的圖片檔")
+    parser.add_argument("--black-frame", action="store_true", help="在頁面加上黑框")
+    parser.add_argument("--crop", action="store_true", help="擷取頁面中的圖片")
+    parser.add_argument("--mask-figures", action="store_true",
+                        help="搭配 --crop：上傳前把圖片區塊遮掉，文字中以佔位連到存出的圖檔")
+    parser.add_argument("--slowdown", action="store_true", help="只使用一半的配額")
+    parser.add_argument("--resume", action="store_true", help="接續上次進度")
+    parser.add_argument("--route", action="store_true",
+                        help="自動分級：依 conf.txt 的 model_tiers 先用較快的模型，失敗才升級到 --model")
+    parser.add_argument("--min-area", type=int, default=10000, help="擷取圖片的最小面積")
+    parser.add_argument("--padding", type=int, default=60, help="擷取圖片的外擴像素")
+    parser.add_argument("--watch", action="store_true", help="持續監看輸入資料夾，只處理新增或變更的檔案")
+    parser.add_argument("--poll-interval", type=float, default=5.0,
+                        help="無法使用 inotify 時的掃描間隔秒數 (預設 5)")
+    return parser
+
+
+def run_pipeline(args, api_key, page_ranges, options, additional_prompt):
+    """執行一次 process_mainflow，回傳 (exit code, 失敗頁面的 (檔名, 頁碼) list)"""
+    from process_main import process_mainflow
+    from run_report import RunReport
+
+    report = RunReport(args.model)
+    try:
+        success = process_mainflow(api_key, page_ranges, options, args.min_area, args.padding,
+                                   additional_prompt, args.model, report)
+    except KeyboardInterrupt:
+        raise
+    except Exception:
+        traceback.print_exc()
+        return EXIT_FAILED, []
+    if not success:
+        return EXIT_FAILED, []
+    failed = report.failed_pages()
+    if failed:
+        print(f"⚠️ {len(failed)} 頁辨識失敗", file=sys.stderr)
+        return EXIT_PARTIAL, failed
+    return EXIT_OK, []
+
+
+def process_changes(args, api_key, options, additional_prompt, watcher, changed):
+    """處理監看到的新檔案，成功的檔案記為已處理，失敗的留到下次重新掃描時再試"""
+    pdfs = [f for f in changed if f.lower().endswith(".pdf")]
+    images = [f for f in changed if f not in pdfs]
+    if images and not options["transcribe"]:
+        watcher.mark_done(images)
+        images = []
+    if not pdfs and not images:
+        return
+    print(f"🆕 新增或變更的檔案: {', '.join(pdfs + images)}")
+    sys.stdout.flush()
+
+    page_ranges = {}
+    for pdf in pdfs:
+        try:
+            page_ranges.update(build_page_ranges(options["input_dir"], args.pages, "all", only={pdf}))
+        except ValueError as e:
+            print(f"❌ {pdf}: {e}")
+    if not page_ranges and not images:
+        return
+
+    # images are one "picture" document, so all of them are rerun;
+    # unchanged ones are answered from the OCR cache
+    run_options = dict(options, transcribe=bool(images))
+    code, failed = run_pipeline(args, api_key, page_ranges, run_options, additional_prompt)
+    if code == EXIT_FAILED:
+        return
+    failed_files = {name for name, _ in failed}
+    done = [f for f in page_ranges if os.path.splitext(f)[0] not in failed_files]
+    if "picture" not in failed_files:
+        done += images
+    watcher.mark_done(done)
+
+
+def watch(args, api_key, options, additional_prompt):
+    from watch_folder import FolderWatcher
+
+    watcher = FolderWatcher(options["input_dir"], os.path.join("cache", "watch_state.json"),
+                            poll_interval=args.poll_interval)
+    mode = "inotify" if watcher.notifier is not None else f"每 {args.poll_interval:g} 秒掃描"
+    print(f"👀 監看 {options['input_dir']} ({mode})，Ctrl+C 結束")
+    sys.stdout.flush()
+    names = None
+    try:
+        while True:
+            changed = watcher.scan(names)
+            if changed:
+                process_changes(args, api_key, options, additional_prompt, watcher, changed)
+                print(f"👀 繼續監看 {options['input_dir']}")
+                sys.stdout.flush()
+            names = watcher.wait()
+    finally:
+        watcher.close()
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    input_dir = os.path.abspath(args.input)
+    output_dir = os.path.abspath(args.output)
+
+    additional_prompt = args.prompt
+    if args.prompt_file:
+        try:
+            with open(args.prompt_file, "r", encoding="utf-8") as f:
+                additional_prompt += f.read().strip()
+        except OSError as e:
+            print(f"❌ 無法讀取 prompt 檔案: {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+    # setting/, cache/ and recordings/ are resolved relative to the program folder
+    os.chdir(ROOT)
+    api_key = read_api_key(args)
+    options = {
+        "transcribe": not args.no_images,
+        "black_frame": args.black_frame,
+        "crop": args.crop,
+        "mask_figures": args.mask_figures,
+        "slowdown": args.slowdown,
+        "resume": args.resume,
+        "routing": args.route,
+        "input_dir": input_dir,
+        "output_dir": output_dir,
+        "open_output": False,
+    }
+
+    try:
+        if args.watch:
+            if not os.path.isdir(input_dir):
+                print(f"❌ 找不到輸入資料夾 {input_dir}", file=sys.stderr)
+                return EXIT_USAGE
+            watch(args, api_key, options, additional_prompt)
+            return EXIT_OK
+        try:
+            page_ranges = build_page_ranges(input_dir, args.pages, args.default_pages)
+        except ValueError as e:
+            print(f"❌ {e}", file=sys.stderr)
+            return EXIT_USAGE
+        return run_pipeline(args, api_key, page_ranges, options, additional_prompt)[0]
+    except KeyboardInterrupt:
+        print("⛔ 已中斷，可加 --resume 接續", file=sys.stderr)
+        return EXIT_INTERRUPTED
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,54 @@
+from itertools import groupby
+from docx import Document
+from docx.shared import Pt
+from docx.oxml.ns import qn
+
+CJK_FONT = "標楷體"
+LATIN_FONT = "Times New Roman"
+
+
+def contains_chinese(char):
+    return '\u4e00' <= char <= '\u9fff'
+
+
+def char_style(char):
+    """回傳 (字型, 是否斜體)：中文用標楷體，英文字母用 Times New Roman 斜體，其餘 Times New Roman"""
+    if contains_chinese(char):
+        return CJK_FONT, False
+    return LATIN_FONT, char.isalpha()
+
+
+def new_document():
+    """Normal 樣式預設為 Times New Roman 12pt，run 只需要設定與預設不同的部分"""
+    doc = Document()
+    normal = doc.styles["Normal"]
+    normal.font.name = LATIN_FONT
+    normal.font.size = Pt(12)
+    normal.element.rPr.rFonts.set(qn("w:eastAsia"), LATIN_FONT)
+    return doc
+
+
+def add_styled_line(doc, line):
+    """連續同樣式的字元合併成一個 run，而不是每個字元一個 run"""
+    p = doc.add_paragraph()
+    for (font, italic), chars in groupby(line, key=char_style):
+        run = p.add_run("".join(chars))
+        if font != LATIN_FONT:
+            run.font.name = font
+            run._element.rPr.rFonts.set(qn("w:eastAsia"), font)
+        if italic:
+            run.italic = True
+    return p
+
+
+def build_docx(texts, output_file):
+    """把每頁的文字依序寫成 docx，每頁之後空一行"""
+    doc = new_document()
+    for text in texts:
+        for line in f"{text}\n\n".splitlines():
+            if not line:
+                doc.add_paragraph("")
+                continue
+            add_styled_line(doc, line)
+    doc.save(output_file)
+    return output_file
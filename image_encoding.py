@@ -0,0 +1,66 @@
+from io import BytesIO
+from PIL import Image
+
+MIME_TYPES = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "webp": "image/webp",
+}
+
+DEFAULT_PROFILE = {
+    "format": "png",     # png / jpeg / webp
+    "quality": 85,       # jpeg / webp 品質
+    "mode": "rgb",       # rgb / gray / binary
+    "long_edge": 0,      # 長邊縮到幾 px，0 表示不縮
+}
+
+
+def load_profile(config):
+    """從 conf.txt 的 encode_* 設定組出編碼設定"""
+    config = config or {}
+    profile = dict(DEFAULT_PROFILE)
+    profile["format"] = config.get("encode_format", profile["format"]).lower()
+    profile["quality"] = int(config.get("encode_quality", profile["quality"]))
+    profile["mode"] = config.get("encode_mode", profile["mode"]).lower()
+    profile["long_edge"] = int(config.get("encode_long_edge", profile["long_edge"]))
+    if profile["format"] not in MIME_TYPES:
+        print(f"⚠️ 不支援的 encode_format: {profile['format']}，改用 png")
+        profile["format"] = "png"
+    return profile
+
+
+def describe(profile):
+    edge = profile["long_edge"] or "原尺寸"
+    quality = "" if profile["format"] == "png" else f" q{profile['quality']}"
+    return f"{profile['format']}{quality} {profile['mode']} 長邊 {edge}"
+
+
+def prepare_image(img, profile):
+    """依設定縮圖並轉成灰階 / 黑白，不修改原圖"""
+    long_edge = profile["long_edge"]
+    w, h = img.size
+    if long_edge and max(w, h) > long_edge:
+        scale = long_edge / max(w, h)
+        img = img.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS)
+    if profile["mode"] == "gray":
+        img = img.convert("L")
+    elif profile["mode"] == "binary":
+        img = img.convert("L").point(lambda p: 255 if p > 180 else 0)
+        if profile["format"] == "png":
+            # 1-bit png is far smaller than an 8-bit one
+            img = img.convert("1")
+    return img
+
+
+def encode_page(img, profile):
+    """回傳 (bytes, mime_type, 上傳圖片的尺寸)"""
+    out = prepare_image(img, profile)
+    buffer = BytesIO()
+    fmt = profile["format"]
+    if fmt == "png":
+        out.save(buffer, format="PNG")
+    elif fmt == "jpeg":
+        out.save(buffer, format="JPEG", quality=profile["quality"], optimize=True)
+    else:
+        out.save(buffer, format="WEBP", quality=profile["quality"], method=4)
+    return buffer.getvalue(), MIME_TYPES[fmt], out.size
@@ -0,0 +1,149 @@
+import threading
+import time
+
+from rate_limiter import backoff_delay, error_code, is_auth_error, is_retryable, retry_after_seconds
+
+
+def mask_key(key):
+    """只顯示 key 的末四碼"""
+    return f"…{key[-4:]}" if key else "(無 key)"
+
+
+def is_daily_quota(error):
+    """每日配額用完，等幾秒重試也沒有用"""
+    message = str(error).lower()
+    return error_code(error) == 429 and ("per day" in message or "perday" in message)
+
+
+class KeySlot:
+    """一把 API key 在某個模型上的後端、限流器與健康狀態"""
+
+    def __init__(self, label, model, limiter):
+        self.label = label
+        self.model = model
+        self.limiter = limiter
+        self.in_flight = 0
+        self.disabled_until = 0.0   # auth or daily quota error: skipped until then
+        self.calls = 0
+        self.errors = 0
+        self.cooldowns = 0
+
+
+class KeyPool:
+    """
+    同一個模型分散到多把 API key：
+    - 每把 key 有自己的後端與 RPM / TPM 限流器，總配額隨 key 的數量增加
+    - 每個請求交給可以立即送出、進行中請求最少的 key；都需要等待時等最快可用的那把
+    - 收到 429 的 key 依建議秒數冷卻，其他 key 照常送出；
+      key 無效、沒有權限或每日配額用完時停用 disable_s 秒，所有 key 都停用時直接拋出錯誤
+    """
+
+    def __init__(self, slots, disable_s=600.0):
+        self.slots = slots
+        self.disable_s = disable_s
+        self.lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self.slots[0].model
+
+    @property
+    def rpm(self):
+        return sum(slot.limiter.rpm for slot in self.slots)
+
+    @property
+    def tpm(self):
+        return sum(slot.limiter.tpm for slot in self.slots)
+
+    def acquire(self, est_tokens):
+        """阻塞直到某把 key 可以送出預估 est_tokens 的請求，回傳該 KeySlot"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                usable = [slot for slot in self.slots if slot.disabled_until <= now]
+                if not usable:
+                    raise RuntimeError("所有 API key 都已停用 (無效、沒有權限或每日配額用完)")
+                waits = []
+                # least loaded first; ties go to the key with fewer calls so far
+                for slot in sorted(usable, key=lambda s: (s.in_flight, s.calls)):
+                    wait = slot.limiter.try_acquire(est_tokens)
+                    if wait <= 0:
+                        slot.in_flight += 1
+                        slot.calls += 1
+                        return slot
+                    waits.append(wait)
+            time.sleep(min(waits))
+
+    def release(self, slot, error=None):
+        with self.lock:
+            slot.in_flight -= 1
+            if error is not None:
+                slot.errors += 1
+
+    def cool_down(self, slot, seconds):
+        """429：只有這把 key 暫停，acquire() 會把請求交給其他 key"""
+        slot.limiter.pause(seconds)
+        with self.lock:
+            slot.cooldowns += 1
+
+    def disable(self, slot):
+        with self.lock:
+            slot.disabled_until = time.monotonic() + self.disable_s
+            slot.cooldowns += 1
+        print(f"🔑 API key {slot.label} 暫停使用 {self.disable_s:.0f} 秒")
+
+    def call(self, parts, est_tokens, max_retries=5, on_retry=None, timing=None):
+        """
+        送出請求並回傳 (回應, 使用的 KeySlot)，遇到 429 / 5xx 時以 backoff 重試
+        重試會先交給其他可用的 key；超過 max_retries 次仍失敗則把最後的例外拋出
+        timing 為 dict 時分開累加秒數：request_s 模型請求本身、quota_wait_s 等待限流、backoff_s 重試前的等待
+        """
+        if timing is None:
+            timing = {}
+        for field in ("request_s", "quota_wait_s", "backoff_s"):
+            timing.setdefault(field, 0.0)
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            slot = self.acquire(est_tokens)
+            sent = time.perf_counter()
+            timing["quota_wait_s"] += sent - start
+            try:
+                try:
+                    response = slot.model.generate_content(parts)
+                finally:
+                    timing["request_s"] += time.perf_counter() - sent
+            except Exception as e:
+                self.release(slot, e)
+                if is_auth_error(e) or is_daily_quota(e):
+                    self.disable(slot)
+                    if len(self.slots) == 1 or attempt >= max_retries:
+                        raise
+                    print(f"⚠️ API key {slot.label} 無法使用，改用其他 key ({str(e)[:80]})")
+                elif attempt >= max_retries or not is_retryable(e):
+                    raise
+                else:
+                    delay = max(retry_after_seconds(e) or 0.0, backoff_delay(attempt))
+                    if error_code(e) == 429 or retry_after_seconds(e):
+                        self.cool_down(slot, delay)
+                        print(f"⚠️ API key {slot.label} 配額錯誤，冷卻 {delay:.1f} 秒後重試 ({attempt + 1}/{max_retries})")
+                    else:
+                        print(f"⚠️ 連線錯誤，{delay:.1f} 秒後重試 ({attempt + 1}/{max_retries})")
+                        time.sleep(delay)
+                        timing["backoff_s"] += delay
+                if on_retry is not None:
+                    on_retry(e)
+                attempt += 1
+                continue
+            self.release(slot)
+            return response, slot
+
+    def close(self):
+        for slot in self.slots:
+            slot.model.close()
+
+    def summary_lines(self):
+        now = time.monotonic()
+        return [f"{slot.label}  呼叫 {slot.calls:4d} 次  錯誤 {slot.errors:3d}  冷卻 {slot.cooldowns:3d} 次"
+                + ("  (停用中)" if slot.disabled_until > now else "")
+                for slot in self.slots]
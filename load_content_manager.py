@@ -1,4 +1,16 @@
 import os
+import re
+
+def parse_keys(text):
+    """把以逗號、空白或換行分隔的多把 key 拆成 list，去掉重複與 # 開頭的註解行"""
+    keys = []
+    for line in (text or "").splitlines():
+        if line.strip().startswith("#"):
+            continue
+        for key in re.split(r"[\s,]+", line):
+            if key and key not in keys:
+                keys.append(key)
+    return keys
 
 class APIKeyManager:
     def __init__(self, filename="API_key.txt"):
@@ -8,18 +20,22 @@ class APIKeyManager:
             with open(self.filename, "w", encoding="utf-8") as f:
                 f.write("")
 
-    def read_key(self):
-        """讀取 API key"""
+    def read_keys(self):
+        """讀取所有 API key (每行一把)"""
         try:
             with open(self.filename, "r", encoding="utf-8") as f:
-                return f.read().strip()
+                return parse_keys(f.read())
         except:
-            return ""
+            return []
+
+    def read_key(self):
+        """讀取 API key，有多把時以逗號分隔"""
+        return ", ".join(self.read_keys())
 
     def write_key(self, key: str):
-        """寫入 API key"""
+        """寫入 API key，多把 key 以逗號或空白分隔，存成每行一把"""
         with open(self.filename, "w", encoding="utf-8") as f:
-            f.write(key.strip())
+            f.write("\n".join(parse_keys(key)))
 
 class ModelManager:
     def loadModel(self, filepath="setting/model.txt"):
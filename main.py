@@ -1,8 +1,11 @@
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from ui_main import MainWindow
 
 if __name__ == "__main__":
+    # needed by the rasterizer process pool in frozen Windows builds
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
 
     window = MainWindow()
@@ -0,0 +1,127 @@
+import os
+import re
+import threading
+from collections import Counter
+
+# $ not escaped as \$
+DOLLAR = re.compile(r"(?<!\\)\$")
+BEGIN_ENV = re.compile(r"\\begin\{")
+END_ENV = re.compile(r"\\end\{")
+
+
+def check_text(text):
+    """
+    便宜的本地檢查，回傳不通過的原因，通過時回傳 None
+    空白輸出、$ 不成對、\\begin / \\end 或大括號不成對、同一行大量重複 (模型陷入迴圈)
+    """
+    stripped = text.strip()
+    if not stripped or stripped == "[No text detected]":
+        return "空白輸出"
+    if len(DOLLAR.findall(stripped)) % 2:
+        return "$ 不成對"
+    if len(BEGIN_ENV.findall(stripped)) != len(END_ENV.findall(stripped)):
+        return "\\begin/\\end 不成對"
+    unescaped = re.sub(r"\\[{}]", "", stripped)
+    if unescaped.count("{") != unescaped.count("}"):
+        return "大括號不成對"
+    lines = [line.strip() for line in stripped.splitlines() if len(line.strip()) >= 10]
+    if lines:
+        _, repeats = Counter(lines).most_common(1)[0]
+        if repeats >= 10 and repeats > len(lines) * 0.3:
+            return "內容重複"
+    return None
+
+
+def load_prices(file_path):
+    """
+    讀取 pricing.txt，每行格式為 "model: 輸入價格, 輸出價格" (USD / 每百萬 tokens)
+    回傳 {model: (input, output)}
+    """
+    prices = {}
+    if not os.path.exists(file_path):
+        return prices
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if ":" not in line:
+                continue
+            model, value = line.split(":", 1)
+            try:
+                price_in, price_out = (float(v) for v in value.split(","))
+            except ValueError:
+                continue
+            prices[model.strip()] = (price_in, price_out)
+    return prices
+
+
+def route_models(tiers, selected):
+    """
+    分級順序 (由快到慢) 中到 selected 為止的模型；
+    selected 不在清單中時放在最後一級
+    """
+    if selected in tiers:
+        return tiers[:tiers.index(selected) + 1]
+    return tiers + [selected]
+
+
+class ModelTier:
+    """分級中的一個模型：自己的 key pool (各 key 的後端與限流器) 與統計 (多個 worker 共用)"""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.seconds = 0.0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.pages = 0          # pages whose final text came from this tier
+        self.escalated = 0      # pages passed on to the next tier
+        self.errors = 0
+
+    def add_call(self, seconds, prompt_tokens, output_tokens):
+        with self.lock:
+            self.calls += 1
+            self.seconds += seconds
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+
+    def add_result(self, pages=0, escalated=0, errors=0):
+        with self.lock:
+            self.pages += pages
+            self.escalated += escalated
+            self.errors += errors
+
+    def cost(self, prices):
+        price_in, price_out = prices.get(self.name, (0.0, 0.0))
+        return (self.prompt_tokens * price_in + self.output_tokens * price_out) / 1e6
+
+
+def tier_summary(tiers, prices):
+    """各級的頁數、升級次數、耗時與費用，並與全部使用最高級模型比較"""
+    lines = []
+    for tier in tiers:
+        lines.append(
+            f"{tier.name:<24} 完成 {tier.pages:4d} 頁  升級 {tier.escalated:3d}  錯誤 {tier.errors:3d}  "
+            f"呼叫 {tier.calls:4d} 次 {tier.seconds:7.1f} 秒  ${tier.cost(prices):.4f}")
+    calls = sum(t.calls for t in tiers)
+    if len(tiers) < 2 or not calls:
+        return lines
+
+    top = tiers[-1]
+    price_in, price_out = prices.get(top.name, (0.0, 0.0))
+    # an all-top run sends each page once; the first tier saw every page exactly once
+    first = tiers[0]
+    top_cost = (first.prompt_tokens * price_in + first.output_tokens * price_out) / 1e6
+    actual_cost = sum(t.cost(prices) for t in tiers)
+    if prices:
+        lines.append(f"全部使用 {top.name} 估計 ${top_cost:.4f}，實際 ${actual_cost:.4f}，"
+                     f"省下 ${top_cost - actual_cost:.4f}")
+    if top.calls:
+        # escalated requests are single pages, so this is the top tier's time per page
+        top_seconds = top.seconds / top.calls * sum(t.pages for t in tiers)
+        actual_seconds = sum(t.seconds for t in tiers)
+        lines.append(f"全部使用 {top.name} 估計模型耗時 {top_seconds:.1f} 秒，實際 {actual_seconds:.1f} 秒，"
+                     f"省下 {top_seconds - actual_seconds:.1f} 秒")
+    else:
+        lines.append(f"沒有頁面升級到 {top.name}，無法估計其耗時")
+    return lines
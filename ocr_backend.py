@@ -0,0 +1,280 @@
+import hashlib
+import datetime
+import json
+import os
+import random
+import threading
+import time
+
+
+class OCRBackend:
+    """
+    辨識模型介面，process_mainflow 只透過這幾個方法使用模型
+    generate_content(parts) 的 parts 為 {"text": ...} 或 {"mime_type": ..., "data": ...} 的 list，
+    回傳的物件需有 .text 與 .usage_metadata (prompt_token_count / candidates_token_count)
+    """
+
+    model_name = ""
+    system_instruction = None
+
+    def generate_content(self, parts):
+        raise NotImplementedError
+
+    def count_tokens(self, text):
+        return len(text)
+
+    def close(self):
+        pass
+
+
+# context caching rejects contents shorter than this (the API minimum differs per model)
+CACHE_MIN_TOKENS = 4096
+
+
+class GeminiBackend(OCRBackend):
+    """
+    Gemini 模型：固定的 prompt 以 system instruction 設定一次，
+    cache_ttl_min > 0 且 prompt 至少 cache_min_tokens 時再放進 context cache，之後每頁請求只需要帶圖片
+    """
+
+    def __init__(self, api_key, model_name, system_instruction=None, cache_ttl_min=0,
+                 cache_min_tokens=CACHE_MIN_TOKENS):
+        # imported here so fake / local / replay runs never load the SDK
+        import google.generativeai as genai
+        from google.ai import generativelanguage as glm
+        from google.generativeai import caching
+
+        # the cache API only uses the global client, so configure it for this key while creating the cache
+        genai.configure(api_key=api_key)
+        # requests go through a client of our own so several keys can be used side by side
+        self.client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+        self.api_key = api_key
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.cached_content = None
+        if system_instruction and cache_ttl_min > 0 and self.cacheable(system_instruction, cache_min_tokens):
+            try:
+                self.cached_content = caching.CachedContent.create(
+                    model=model_name,
+                    system_instruction=system_instruction,
+                    ttl=datetime.timedelta(minutes=cache_ttl_min),
+                )
+                self.model = genai.GenerativeModel.from_cached_content(self.cached_content)
+                print("🗄️ prompt 已放入模型端快取")
+            except Exception as e:
+                # explicit caching has a minimum prompt size and is not on every model
+                print(f"⚠️ 無法建立 prompt 快取，改用 system instruction ({e})")
+                self.cached_content = None
+        if self.cached_content is None:
+            self.model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+        self.model._client = self.client
+
+    def cacheable(self, text, min_tokens):
+        """短於快取最小長度的 prompt 一定建立失敗，不必每把 key 每個模型都送一次請求"""
+        # a token is at least one character, so a short prompt needs no count_tokens call
+        if len(text) < min_tokens:
+            return False
+        return self.count_tokens(text) >= min_tokens
+
+    def generate_content(self, parts):
+        return self.model.generate_content(parts)
+
+    def count_tokens(self, text):
+        import google.generativeai as genai
+
+        try:
+            model = genai.GenerativeModel(self.model_name)
+            model._client = self.client
+            return model.count_tokens(text).total_tokens
+        except Exception:
+            return len(text)
+
+    def close(self):
+        if self.cached_content is not None:
+            import google.generativeai as genai
+
+            try:
+                genai.configure(api_key=self.api_key)
+                self.cached_content.delete()
+            except Exception:
+                pass
+            self.cached_content = None
+
+
+class LocalUsage:
+    def __init__(self, prompt_token_count, candidates_token_count, cached_content_token_count=0):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.cached_content_token_count = cached_content_token_count
+
+
+class LocalResponse:
+    def __init__(self, text, usage_metadata):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class LocalBackend(OCRBackend):
+    """
+    離線替身：不呼叫任何 API，依圖片內容回傳固定文字，token 以字數 / 每張圖 258 估算
+    用來檢查 system instruction、多頁請求等流程，不花費配額
+    和 API 一樣，system instruction 少於 cache_min_tokens 時不會有快取命中
+    """
+
+    def __init__(self, model_name, system_instruction=None, cache_ttl_min=0, cache_min_tokens=CACHE_MIN_TOKENS):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.cached = (bool(system_instruction) and cache_ttl_min > 0
+                       and self.count_tokens(system_instruction) >= cache_min_tokens)
+
+    def generate_content(self, parts):
+        images = [p for p in parts if "data" in p]
+        text_tokens = sum(len(p["text"]) for p in parts if "text" in p)
+        system_tokens = len(self.system_instruction or "")
+        texts = [f"[local {self.model_name}] {hashlib.sha256(p['data']).hexdigest()[:12]}" for p in images]
+        if len(images) > 1:
+            text = "\n".join(f"<<<PAGE {n}>>>\n{t}" for n, t in enumerate(texts, start=1))
+        else:
+            text = texts[0] if texts else ""
+        usage = LocalUsage(
+            prompt_token_count=system_tokens + text_tokens + 258 * len(images),
+            candidates_token_count=len(text),
+            cached_content_token_count=system_tokens if self.cached else 0,
+        )
+        return LocalResponse(text, usage)
+
+
+class FakeError(Exception):
+    """FakeBackend 模擬的 API 錯誤，code 與訊息格式和 google.api_core 的錯誤相同"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeBackend(LocalBackend):
+    """
+    壓力測試用的假模型：每次請求等待 latency 秒 (±jitter 比例)，
+    並以 error_rate 的機率丟出 429 (附 retry 秒數) 或 503
+    """
+
+    def __init__(self, model_name, system_instruction=None, cache_ttl_min=0,
+                 latency=1.0, jitter=0.3, error_rate=0.0, seed=None, cache_min_tokens=CACHE_MIN_TOKENS):
+        super().__init__(model_name, system_instruction, cache_ttl_min, cache_min_tokens)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def generate_content(self, parts):
+        with self.lock:
+            delay = self.latency * (1 + self.random.uniform(-self.jitter, self.jitter))
+            fail = self.random.random() < self.error_rate
+            quota = self.random.random() < 0.5
+        time.sleep(max(0.0, delay))
+        if fail:
+            if quota:
+                raise FakeError(429, "Resource has been exhausted (e.g. check quota). Please retry in 1s.")
+            raise FakeError(503, "The model is overloaded. Please try again later.")
+        return super().generate_content(parts)
+
+
+class RecordReplayBackend(OCRBackend):
+    """
+    把 inner 的回應存到 record_dir，之後相同的請求直接從硬碟回放
+    mode: "record" 一律呼叫 inner 並存檔；"replay" 只從硬碟讀，沒有紀錄就丟出錯誤；
+          "auto" 有紀錄就回放，沒有才呼叫 inner 並存檔
+    """
+
+    def __init__(self, inner, record_dir="recordings", mode="auto"):
+        self.inner = inner
+        self.model_name = inner.model_name
+        self.system_instruction = inner.system_instruction
+        self.record_dir = record_dir
+        self.mode = mode
+        self.recorded = 0
+        self.replayed = 0
+        os.makedirs(self.record_dir, exist_ok=True)
+
+    def request_key(self, parts):
+        h = hashlib.sha256()
+        h.update(self.model_name.encode("utf-8"))
+        h.update(b"\0" + (self.system_instruction or "").encode("utf-8"))
+        for part in parts:
+            if "data" in part:
+                h.update(b"\0img\0" + part["mime_type"].encode("utf-8") + part["data"])
+            else:
+                h.update(b"\0txt\0" + part["text"].encode("utf-8"))
+        return h.hexdigest()
+
+    def generate_content(self, parts):
+        path = os.path.join(self.record_dir, self.request_key(parts) + ".json")
+        if self.mode != "record" and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                rec = json.load(f)
+            self.replayed += 1
+            return LocalResponse(rec["text"], LocalUsage(**rec["usage"]))
+        if self.mode == "replay":
+            raise KeyError(f"no recorded response for this request ({os.path.basename(path)})")
+
+        response = self.inner.generate_content(parts)
+        usage = getattr(response, "usage_metadata", None)
+        rec = {
+            "model": self.model_name,
+            "text": response.text if getattr(response, "text", None) else "",
+            "usage": {
+                "prompt_token_count": getattr(usage, "prompt_token_count", 0) or 0,
+                "candidates_token_count": getattr(usage, "candidates_token_count", 0) or 0,
+                "cached_content_token_count": getattr(usage, "cached_content_token_count", 0) or 0,
+            },
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rec, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self.recorded += 1
+        return response
+
+    def count_tokens(self, text):
+        if self.mode == "replay":
+            return len(text)
+        return self.inner.count_tokens(text)
+
+    def close(self):
+        print(f"📼 回放 {self.replayed} 次 / 新錄製 {self.recorded} 次 ({self.record_dir})")
+        self.inner.close()
+
+
+def create_backend(config, api_key, model_name, system_instruction=None):
+    """
+    依 conf.txt 建立模型：
+    ocr_backend: gemini / local / fake
+    backend_record: off / record / replay / auto  (record_dir 為存放目錄)
+    fake_latency_s, fake_error_rate: fake 的延遲與錯誤率
+    prompt_cache_min_tokens: 快取的最小長度，gemini 短於此長度時不建立快取，local / fake 依此模擬快取命中
+    """
+    kind = config.get("ocr_backend", "gemini")
+    cache_ttl_min = int(config.get("prompt_cache_ttl_min", 60))
+    record_mode = config.get("backend_record", "off")
+    cache_min_tokens = int(config.get("prompt_cache_min_tokens", CACHE_MIN_TOKENS))
+
+    if kind == "local":
+        backend = LocalBackend(model_name, system_instruction, cache_ttl_min, cache_min_tokens)
+    elif kind == "fake":
+        backend = FakeBackend(
+            model_name, system_instruction, cache_ttl_min,
+            latency=float(config.get("fake_latency_s", 1.0)),
+            error_rate=float(config.get("fake_error_rate", 0.0)),
+            cache_min_tokens=cache_min_tokens,
+        )
+    elif record_mode == "replay":
+        # offline replay never touches the API
+        backend = LocalBackend(model_name, system_instruction)
+    else:
+        backend = GeminiBackend(api_key, model_name, system_instruction, cache_ttl_min, cache_min_tokens)
+    print(f"🔌 模型後端: {kind}")
+
+    if record_mode != "off":
+        backend = RecordReplayBackend(backend, config.get("record_dir", "recordings"), record_mode)
+    return backend
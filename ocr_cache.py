@@ -0,0 +1,91 @@
+import hashlib
+import os
+import threading
+
+
+class OCRCache:
+    """
+    以 (頁面圖片 bytes, prompt, model) 的 hash 為 key 的辨識結果快取
+    每筆結果存成 cache_dir 下的一個 txt，超過 max_bytes 時依最後使用時間 (LRU) 刪除
+    """
+
+    def __init__(self, cache_dir="cache", max_bytes=200 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # key -> [size, last_used]
+        self.index = {}
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".txt"):
+                continue
+            st = os.stat(os.path.join(self.cache_dir, name))
+            self.index[name[:-4]] = [st.st_size, st.st_mtime]
+        self.total_bytes = sum(size for size, _ in self.index.values())
+
+    @staticmethod
+    def make_key(page_bytes, prompt, model_name):
+        h = hashlib.sha256()
+        h.update(page_bytes)
+        h.update(b"\0" + prompt.encode("utf-8"))
+        h.update(b"\0" + model_name.encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".txt")
+
+    def get(self, key):
+        """回傳快取的文字，沒有則回傳 None"""
+        with self.lock:
+            if key not in self.index:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    text = f.read()
+            except OSError:
+                self._drop(key)
+                self.misses += 1
+                return None
+            # mtime doubles as the LRU timestamp across runs
+            os.utime(self._path(key))
+            self.index[key][1] = os.path.getmtime(self._path(key))
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        data = text.encode("utf-8")
+        with self.lock:
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+            if key in self.index:
+                self.total_bytes -= self.index[key][0]
+            self.index[key] = [len(data), os.path.getmtime(self._path(key))]
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _drop(self, key):
+        size, _ = self.index.pop(key)
+        self.total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key in sorted(self.index, key=lambda k: self.index[k][1]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            self._drop(key)
+
+    def summary(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        return f"快取命中 {self.hits} / 未命中 {self.misses} ({rate:.0f}%)，共 {len(self.index)} 筆 {self.total_bytes / 1024:.0f} KB"
@@ -0,0 +1,105 @@
+import hashlib
+import zlib
+import cv2
+import numpy as np
+from PIL import Image
+
+# pages are analysed at this width; duplicate candidates are confirmed at this resolution too
+ANALYSE_WIDTH = 512
+# largest per-pixel difference still counted as the same page (re-encoding noise);
+# one changed glyph at 200 dpi moves some analysis pixels by far more than this
+DUP_TOLERANCE = 8
+# pixels darker than this count as ink
+INK_LEVEL = 160
+# specks smaller than this (scan dust) are not counted as ink of a blank page
+SPECK_PIXELS = 4
+# ignore this fraction of each edge, where scan borders and the black frame live
+MARGIN = 0.04
+
+
+def dhash(gray, hash_size=16):
+    """difference hash：相鄰像素亮度比較，回傳 hash_size*hash_size 個 bool"""
+    small = gray.resize((hash_size + 1, hash_size), Image.BILINEAR)
+    px = np.asarray(small, dtype=np.int16)
+    return (px[:, 1:] > px[:, :-1]).flatten()
+
+
+class PageFilter:
+    """
+    送去辨識前先檢查頁面：
+    - 空白頁 (原解析度下去掉邊緣與小污點後，墨水像素少於 blank_pixels) 直接略過
+    - 與本次執行中先前頁面內容完全相同 (原圖 bytes 相同，或 dHash 距離 <= dup_distance 且
+      分析解析度下每個像素的差都不超過 DUP_TOLERANCE)，視為重複頁，沿用該頁結果
+    dup_distance < 0 時不檢查重複頁
+    """
+
+    def __init__(self, blank_pixels=20, dup_distance=6):
+        self.blank_pixels = blank_pixels
+        self.dup_distance = dup_distance
+        self.seen = []          # (signature, reference)
+        self.blank = 0
+        self.duplicate = 0
+
+    def analyse(self, img):
+        w, h = img.size
+        full = img.convert("L")
+        gray = full.resize((ANALYSE_WIDTH, max(1, round(h * ANALYSE_WIDTH / w))), Image.BOX)
+        mw, mh = int(gray.width * MARGIN), int(gray.height * MARGIN)
+        inner = gray.crop((mw, mh, gray.width - mw, gray.height - mh))
+        px = np.asarray(gray)
+        ink = self.ink_pixels(full)
+        digest = hashlib.sha256(f"{img.mode}{img.size}".encode() + img.tobytes()).digest()
+        # kept compressed: mostly white pages shrink to a few KB
+        return ink, dhash(inner), digest, px.shape, zlib.compress(px.tobytes(), 1)
+
+    @staticmethod
+    def ink_pixels(full):
+        """
+        原解析度下邊緣以內的墨水像素數；downscale 後的比例會把只有 "5." 這種稀疏頁面算成空白
+        像素數夠多時不必再找連通區塊，只有接近門檻時才扣掉小於 SPECK_PIXELS 的污點
+        """
+        mw, mh = int(full.width * MARGIN), int(full.height * MARGIN)
+        ink = (np.asarray(full.crop((mw, mh, full.width - mw, full.height - mh))) < INK_LEVEL).astype(np.uint8)
+        total = int(ink.sum())
+        if total > 1000:
+            return total
+        _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+        areas = stats[1:, cv2.CC_STAT_AREA]
+        return int(areas[areas >= SPECK_PIXELS].sum())
+
+    @staticmethod
+    def same_page(a, b, dup_distance):
+        _, hash_a, digest_a, shape_a, px_a = a
+        _, hash_b, digest_b, shape_b, px_b = b
+        if digest_a == digest_b:
+            return True
+        if shape_a != shape_b or int(np.count_nonzero(hash_a != hash_b)) > dup_distance:
+            return False
+        # the coarse hash only finds candidates; a page that differs by a single
+        # answer must still differ here, so no pixel may move beyond the tolerance
+        diff = np.abs(np.frombuffer(zlib.decompress(px_a), np.uint8).astype(np.int16)
+                      - np.frombuffer(zlib.decompress(px_b), np.uint8))
+        return int(diff.max()) <= DUP_TOLERANCE
+
+    def check(self, img):
+        """
+        回傳 (種類, reference, signature)，種類為 "blank" / "duplicate" / "new"
+        duplicate 的 reference 是先前登記的頁面；new 的頁面送出後要以 remember() 登記
+        """
+        signature = self.analyse(img)
+        if signature[0] < self.blank_pixels:
+            self.blank += 1
+            return "blank", None, signature
+        if self.dup_distance >= 0:
+            for seen, ref in self.seen:
+                if self.same_page(seen, signature, self.dup_distance):
+                    self.duplicate += 1
+                    return "duplicate", ref, signature
+        return "new", None, signature
+
+    def remember(self, signature, ref):
+        self.seen.append((signature, ref))
+
+    def summary(self):
+        saved = self.blank + self.duplicate
+        return f"略過空白頁 {self.blank} 頁、重複頁 {self.duplicate} 頁，共省下 {saved} 次模型呼叫"
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class PageJournal:
+    """
+    每頁辨識結果的 append-only 紀錄 (JSON Lines)
+    每行: {"page": 3, "model": "...", "prompt_hash": "...", "ok": true, "text": "..."}
+    程式中斷後可用 resume 模式只補做沒完成的頁面，再由紀錄重建 docx
+    sources 為 {頁碼: 來源} 時每行另記 "source"，resume 時來源不同的紀錄不沿用
+    (圖片依檔名排序編頁碼，增減圖片後同一頁碼可能是另一張圖)
+    """
+
+    def __init__(self, path, model_name, prompt, resume=False, fsync_every=5, sources=None):
+        self.path = path
+        self.model_name = model_name
+        self.prompt_hash = prompt_hash(prompt)
+        self.sources = sources
+        self.fsync_every = max(1, fsync_every)
+        self.unsynced = 0
+        # page -> latest text; completed holds pages that need no more OCR
+        self.results = {}
+        self.completed = set()
+        if resume:
+            self._load()
+        else:
+            open(self.path, "w", encoding="utf-8").close()
+        self.f = None
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            # terminate a torn last line so appended records start on a new line
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # torn last line from a crash mid-write
+                    continue
+                if rec.get("model") != self.model_name or rec.get("prompt_hash") != self.prompt_hash:
+                    continue
+                if self.sources is not None and rec.get("source") != self.sources.get(rec["page"]):
+                    continue
+                self.results[rec["page"]] = rec["text"]
+                if rec.get("ok"):
+                    self.completed.add(rec["page"])
+                else:
+                    self.completed.discard(rec["page"])
+
+    def pending(self, pages):
+        """回傳還沒完成的頁碼"""
+        return [p for p in pages if p not in self.completed]
+
+    def record(self, page, text, ok=True):
+        if self.f is None:
+            self.f = open(self.path, "a", encoding="utf-8")
+        rec = {
+            "page": page,
+            "model": self.model_name,
+            "prompt_hash": self.prompt_hash,
+            "ok": ok,
+            "text": text,
+        }
+        if self.sources is not None:
+            rec["source"] = self.sources.get(page)
+        self.f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self.f.flush()
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every:
+            self.sync()
+        self.results[page] = text
+        if ok:
+            self.completed.add(page)
+
+    def sync(self):
+        if self.f is not None and self.unsynced:
+            os.fsync(self.f.fileno())
+            self.unsynced = 0
+
+    def texts(self, pages):
+        """依頁碼順序回傳每頁文字"""
+        return [self.results.get(p, "") for p in pages]
+
+    def close(self):
+        if self.f is not None:
+            self.sync()
+            self.f.close()
+            self.f = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
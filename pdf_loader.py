@@ -1,10 +1,30 @@
+import json
 import os
-from PyPDF2 import PdfReader
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def count_pages(pdf_path):
+    """回傳 PDF 頁數，讀不到時回傳 0 (在子行程中執行)"""
+    from PyPDF2 import PdfReader
+
+    try:
+        # a file handle lets PdfReader seek instead of reading the whole scan into memory
+        with open(pdf_path, "rb") as f:
+            return len(PdfReader(f).pages)
+    except Exception:
+        return 0
 
 
 class PDFLoader:
-    def __init__(self, input_dir="input"):
+    """
+    列出 input 內的 PDF 並取得頁數
+    頁數以 (路徑, 大小, 修改時間) 快取在 cache_file，檔案沒變就不再開啟 PDF
+    """
+
+    def __init__(self, input_dir="input", cache_file=os.path.join("cache", "page_counts.json")):
         self.input_dir = input_dir
+        self.cache_file = cache_file
+        self.cache = self._load_cache()
 
     def list_pdfs(self):
         """回傳 input 內所有 PDF 檔案名稱 list"""
@@ -16,13 +36,81 @@ class PDFLoader:
             if f.lower().endswith(".pdf")
         ]
 
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+            tmp = self.cache_file + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f, ensure_ascii=False)
+            os.replace(tmp, self.cache_file)
+        except OSError:
+            pass
+
+    def _stat_key(self, pdf_file):
+        path = os.path.abspath(os.path.join(self.input_dir, pdf_file))
+        st = os.stat(path)
+        return path, [st.st_size, st.st_mtime_ns]
+
+    def cached_pages(self, pdf_file):
+        """快取中的頁數，沒有或檔案已變更時回傳 None"""
+        try:
+            path, stat = self._stat_key(pdf_file)
+        except OSError:
+            return None
+        rec = self.cache.get(path)
+        if rec and rec["stat"] == stat:
+            return rec["pages"]
+        return None
+
+    def remember(self, pdf_file, pages):
+        try:
+            path, stat = self._stat_key(pdf_file)
+        except OSError:
+            return
+        if pages:
+            self.cache[path] = {"stat": stat, "pages": pages}
+
     def count_total_pages(self, pdf_file):
-        """回傳單一 PDF 的頁面數"""
+        """回傳單一 PDF 的頁數"""
+        pages = self.cached_pages(pdf_file)
+        if pages is None:
+            pages = count_pages(os.path.join(self.input_dir, pdf_file))
+            self.remember(pdf_file, pages)
+        return pages
+
+    def iter_page_counts(self, pdf_files, workers=None):
+        """
+        計算沒有快取的 PDF 頁數，每算完一個就 yield (檔名, 頁數)，順序不固定
+        多個檔案時在子行程中平行計算，結束後寫回快取
+        """
+        if not pdf_files:
+            return
         try:
-            reader = PdfReader(os.path.join(self.input_dir, pdf_file))
-            return len(reader.pages)
-        except:
-            return 0
+            if len(pdf_files) == 1:
+                pages = count_pages(os.path.join(self.input_dir, pdf_files[0]))
+                self.remember(pdf_files[0], pages)
+                yield pdf_files[0], pages
+                return
+            workers = workers or min(len(pdf_files), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(count_pages, os.path.join(self.input_dir, f)): f
+                    for f in pdf_files
+                }
+                for future in as_completed(futures):
+                    pdf_file = futures[future]
+                    pages = future.result()
+                    self.remember(pdf_file, pages)
+                    yield pdf_file, pages
+        finally:
+            self.save_cache()
 
     def get_pdf_info(self):
         """
@@ -33,10 +121,13 @@ class PDFLoader:
         }
         """
         pdfs = self.list_pdfs()
+        counts = {pdf: self.cached_pages(pdf) for pdf in pdfs}
+        missing = [pdf for pdf, pages in counts.items() if pages is None]
+        counts.update(self.iter_page_counts(missing))
         return [
             {
                 "name": pdf,
-                "pages": self.count_total_pages(pdf),
+                "pages": counts[pdf],
             }
             for pdf in pdfs
         ]
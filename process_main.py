@@ -1,19 +1,33 @@
-import google.generativeai as genai
 import os
 import sys
 import cv2
 import warnings
 import numpy as np
-from pdf2image import convert_from_path
-from PyPDF2 import PdfReader
-from io import BytesIO
-from docx import Document
-from docx.shared import Pt
-from docx.oxml.ns import qn
-from PIL import Image, ImageDraw
+from PIL import Image, ImageDraw, ImageFont
+from concurrent.futures import ThreadPoolExecutor, Future
+from functools import partial
+from collections import deque
+import threading
 import time
-
-def process_mainflow(api_key, pdf_file_start_end_dict, options,min_area,paddling, additional_prompt, gemini_model):
+import re
+import hashlib
+import subprocess
+from rate_limiter import build_limiter, estimate_tokens
+from key_pool import KeyPool, KeySlot, mask_key
+from load_content_manager import parse_keys
+from ocr_cache import OCRCache
+from rasterizer import ParallelRasterizer, draw_black_frame
+from page_journal import PageJournal
+from docx_writer import build_docx
+from image_encoding import load_profile, describe, encode_page
+from page_filter import PageFilter
+from ocr_backend import create_backend
+from run_report import RunReport
+from text_layer import TextLayer
+from tiling import Tiler, stitch
+from model_router import ModelTier, check_text, load_prices, route_models, tier_summary
+
+def process_mainflow(api_key, pdf_file_start_end_dict, options,min_area,paddling, additional_prompt, gemini_model, report=None, progress=None):
     """
     pdf_file_start_end_dict: [
         {
@@ -26,23 +40,45 @@ def process_mainflow(api_key, pdf_file_start_end_dict, options,min_area,paddling
     options: {
         'transcribe': True,
         'black_frame': False,
-        'crop': True
+        'crop': True,
+        'slowdown': False,
+        'resume': False,    # 沿用上次中斷時已完成的頁面
+        'mask_figures': False,  # crop 時先把圖片區塊從上傳的圖中遮掉，以佔位文字連到存出的圖檔
+        'routing': False,   # 由 conf.txt 的 model_tiers 最快的模型開始，失敗才升級到 gemini_model
+        'input_dir': 'input',       # 以下為選填
+        'output_dir': 'output',
+        'open_output': True         # 完成後開啟輸出資料夾
     }
+    report: 傳入 RunReport 時記錄在該物件上，呼叫端可在結束後查詢失敗頁面
+    progress: 選填的 callback，依序收到進度事件 dict：
+        {"type": "run_start", "files": 檔案數, "pages": 總頁數}
+        {"type": "file_start", "file": 名稱, "index": 第幾個檔案, "pages": 該檔要處理的頁數}
+        {"type": "page_done", "file": 名稱, "page": 頁碼, "ok": 是否成功}
+        {"type": "file_done", "file": 名稱}
     """
     
 
     # ---------- Set Configuration ----------
     warnings.filterwarnings("ignore", category=RuntimeWarning)
-    INPUT_FOLDER = "input"
-    OUTPUT_FOLDER = "output"
+    INPUT_FOLDER = options.get("input_dir", "input")
+    OUTPUT_FOLDER = options.get("output_dir", "output")
     SETTING_FOLDER = "setting"
     config = read_conf(os.path.join(SETTING_FOLDER, "conf.txt"))
-    poppler_path = config.get("poppler_path")
+    poppler_path = poppler_dir(config)
     generate_Img = options.get("crop")
     image_frame = options.get("black_frame")
     slowdown = options.get("slowdown")
-
-    APIKey = api_key
+    resume = options.get("resume")
+    fsync_every = int(config.get("journal_fsync_pages", 5))
+    tier_names = [gemini_model]
+    if options.get("routing"):
+        tier_names = route_models([m.strip() for m in config.get("model_tiers", "").split(",") if m.strip()],
+                                  gemini_model)
+    # journal and cache entries of a routed run are kept apart from single-model runs
+    model_label = gemini_model if len(tier_names) == 1 else "route:" + ">".join(tier_names)
+
+    # several keys separated by commas spread the requests over their quotas
+    api_keys = parse_keys(api_key)
     main_prompt = read_prompt(os.path.join(SETTING_FOLDER, "mainprompt.txt"),1)
     #additional_prompt = read_prompt("prompt.txt",0)
     final_prompt = main_prompt+additional_prompt
@@ -62,23 +98,71 @@ def process_mainflow(api_key, pdf_file_start_end_dict, options,min_area,paddling
         return False
 
 
+    # ---------- If no API key, skip OCR ----------
+    if not api_keys:
+        print("No available API_key found in conf.txt. Skipping AI text extraction.")
+        sys.stdout.flush()
+        return False
+
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    if report is None:
+        report = RunReport(gemini_model)
+
+    def open_journal(name, sources=None):
+        journal = PageJournal(os.path.join(OUTPUT_FOLDER, name+"content.jsonl"),
+                              model_label, final_prompt, resume, fsync_every, sources)
+        if journal.completed:
+            print(f"⏩ {name}: 已完成 {len(journal.completed)} 頁，從中斷處繼續")
+            sys.stdout.flush()
+        return journal
+
     # ---handle image---
+    # pages are produced lazily by generators so nothing is decoded before it is needed
     if options.get("transcribe"):
         image_files = [f for f in files if f.lower().endswith((".png", ".jpg", ".jpeg"))]
         if image_files:
+            image_paths = [os.path.join(INPUT_FOLDER, f) for f in sorted(image_files)]
+            pages = list(range(1, len(image_files) + 1))
+            # image pages are numbered by sorted name, so each record is tied to its file
+            journal = open_journal("picture", {i: image_source(path) for i, path in zip(pages, image_paths)})
             all_jobs.append((
-            [Image.open(os.path.join(INPUT_FOLDER, f)).convert("RGB") for f in sorted(image_files)],
-            [1, len(image_files)],
-            "picture"
-        ))
+                iter_image_pages(image_paths, journal.pending(pages), False),
+                pages,
+                "picture",
+                journal
+            ))
         else:
             print("No image files detected in input.\n")
             sys.stdout.flush()
 
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-
     # ---------- Main process ----------
     pdf_files = [f for f in files if f.lower().endswith(".pdf")]
+    text_layer = None
+    # vector-only figures do not show up as images in the text layer, so with crop on
+    # every page is rendered and goes through extract_figures
+    if config.get("text_layer", "1") != "0" and not generate_Img:
+        text_layer = TextLayer(int(config.get("text_layer_min_chars", 50)),
+                               max_math=float(config.get("text_layer_max_math", 0.03)),
+                               min_line_chars=int(config.get("text_layer_min_line_chars", 12)))
+    # ocr_workers is per key: each key brings its own quota
+    workers = max(1, int(config.get("ocr_workers", 4))) * max(1, len(api_keys))
+    # pages sent together in one request (1 = one request per page)
+    batch_pages = max(1, int(config.get("batch_pages", 1)))
+    # max_inflight_pages bounds every decoded page alive at once and is split between
+    # pages handed to OCR (queued or being OCR'd) and rendered chunks not yet taken
+    page_budget = int(config.get("max_inflight_pages", workers * 2))
+    # the rasterizer holds max_chunks finished chunks plus the chunk being handed out
+    render_budget = max(2, page_budget - workers * batch_pages)
+    render_chunk_pages = max(1, min(int(config.get("render_chunk_pages", 4)), render_budget // 2))
+    max_chunks = max(1, render_budget // render_chunk_pages - 1)
+    max_inflight = max(workers * batch_pages, page_budget - (max_chunks + 1) * render_chunk_pages)
+    rasterizer = ParallelRasterizer(
+        poppler_path,
+        dpi=200,
+        processes=int(config.get("render_processes", 0)),
+        chunk_size=render_chunk_pages,
+        max_chunks=max_chunks,
+    )
 
     for pdf_file in pdf_files:
         pdf_path = os.path.join(INPUT_FOLDER, pdf_file)
@@ -88,142 +172,739 @@ def process_mainflow(api_key, pdf_file_start_end_dict, options,min_area,paddling
         else:
             continue
         pages = list(range(start, end + 1))
+        baseName = os.path.splitext(pdf_file)[0]
+        journal = open_journal(baseName)
+        todo = journal.pending(pages)
+        if text_layer is not None and todo:
+            # born-digital pages are taken from the embedded text; only the rest is rendered and OCR'd
+            texts, reasons = text_layer.extract(pdf_path, todo)
+            for page, text in texts.items():
+                journal.record(page, text, True)
+                report.add(baseName, page, status="text_layer")
+            todo = journal.pending(pages)
+            if texts:
+                print(f"📝 {pdf_file}: {len(texts)} 頁使用內嵌文字，{len(todo)} 頁送 OCR ({describe_reasons(reasons)})")
+                sys.stdout.flush()
+        rasterizer.add(pdf_path, todo, image_frame)
+        all_jobs.append((rasterizer.iter_pages(pdf_path, todo), pages, baseName, journal))
 
-        print("📄 Converting PDF pages to images...")
-        sys.stdout.flush()
+    # ---------- Configure Gemini and perform OCR ----------
+    # the fixed prompt is set once per run instead of riding along with every page
+    use_system_instruction = config.get("system_instruction", "1") != "0"
+
+    def build_pool(name):
+        # every key gets its own backend and limiter for this model
+        slots = [KeySlot(mask_key(key),
+                         create_backend(config, key, name, final_prompt if use_system_instruction else None),
+                         build_limiter(name, os.path.join(SETTING_FOLDER, "ratelimit.txt"), slowdown, key))
+                 for key in api_keys or [""]]
+        return KeyPool(slots, float(config.get("key_disable_s", 600)))
+
+    tiers = [ModelTier(name, build_pool(name)) for name in tier_names]
+    print("模型:"+" → ".join(tier_names))
+    if len(api_keys) > 1:
+        print(f"🔑 {len(api_keys)} 把 API key 分散請求: " + ", ".join(mask_key(key) for key in api_keys))
+
+    print(f"同時處理頁數: {workers} (記憶體中最多 {max_inflight + (max_chunks + 1) * render_chunk_pages} 頁，"
+          f"其中轉檔 {(max_chunks + 1) * render_chunk_pages} 頁)")
+    if batch_pages > 1:
+        print(f"每次請求 {batch_pages} 頁")
+    for tier in tiers:
+        print(f"配額: {tier.name} {tier.pool.rpm} RPM / {tier.pool.tpm} TPM")
+    sys.stdout.flush()
+    cache = OCRCache("cache", int(config.get("cache_max_mb", 200)) * 1024 * 1024)
+    page_filter = PageFilter(int(config.get("blank_ink_pixels", 20)),
+                             int(config.get("duplicate_hash_distance", 6)))
+    encoding = load_profile(config)
+    tiler = None
+    if config.get("tile", "1") != "0":
+        tiler = Tiler(float(config.get("tile_max_aspect", 2.0)),
+                      int(config.get("tile_max_pixels", 12000000)),
+                      int(config.get("tile_overlap", 60)))
+    print(f"上傳圖片格式: {describe(encoding)}")
+    sys.stdout.flush()
+    ocr_ctx = {
+        "tiers": tiers,
+        "model_name": model_label,
+        "cache": cache,
+        "encoding": encoding,
+        "tiler": tiler,
+        "tile_workers": max(1, int(config.get("tile_workers", 4))),
+        "prompt": final_prompt,
+        "prompt_in_request": not use_system_instruction,
+        "generate_Img": generate_Img,
+        "mask_figures": bool(generate_Img and options.get("mask_figures")),
+        "output_dir": OUTPUT_FOLDER,
+        "min_area": min_area,
+        "paddling": paddling,
+        # crops are saved off the OCR threads
+        "figure_writer": ThreadPoolExecutor(max_workers=1),
+        "usage": TokenUsage(),
+        "report": report,
+    }
 
-        try:
-            imagesPDF = convert_from_path(
-                pdf_path,
-                dpi=200,
-                fmt="png",
-                poppler_path=poppler_path,
-                first_page=pages[0] if pages else None,
-                last_page=pages[-1] if pages else None,
-            )
-        except Exception as e:
-            print("❌ Conversion failed:", e)
+    def notify(kind, **values):
+        if progress is not None:
+            progress(dict(type=kind, **values))
+
+    def record(journal, fileName, result):
+        journal.record(result["page"], result["text"], result["ok"])
+        notify("page_done", file=fileName, page=result["page"], ok=result["ok"])
+
+    notify("run_start", files=len(all_jobs),
+           pages=sum(len(job[3].pending(job[1])) for job in all_jobs))
+    try:
+        for index, (page_iter, pages, fileName, journal) in enumerate(all_jobs, start=1):
+            fileName = os.path.splitext(fileName)[0]
+            notify("file_start", file=fileName, index=index, pages=len(journal.pending(pages)))
+            print(f"----📌Starting text extraction from {fileName}📌----\n")
             sys.stdout.flush()
-            return False
-  
-        if image_frame:
-            for i, img in enumerate(imagesPDF):
-                draw = ImageDraw.Draw(img)
-                w, h = img.size
-                thickness = 10
-                draw.rectangle([0, 0, w-1, h-1], outline="black", width=thickness)
-                imagesPDF[i] = img
-        baseName = os.path.splitext(pdf_file)[0]
-        all_jobs.append((imagesPDF, pages, baseName))
-        print(f"✅ All selected pages in {pdf_file} have been successfully converted.\n")
-        sys.stdout.flush()
+            start_time = time.time()
+            usage_before = ocr_ctx["usage"].snapshot()
+            slots = threading.BoundedSemaphore(max_inflight)
+            pending = deque()
+            page_count = 0
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                batch = []
+
+                def flush_batch():
+                    if not batch:
+                        return
+                    if len(batch) == 1:
+                        i, img, future = batch[0]
+                        job = executor.submit(ocr_page, ocr_ctx, img, fileName, i)
+                    else:
+                        job = executor.submit(ocr_batch, ocr_ctx, [(i, img) for i, img, _ in batch], fileName)
+                    job.add_done_callback(partial(distribute_results, [future for _, _, future in batch],
+                                                  [i for i, _, _ in batch]))
+                    batch.clear()
+
+                while True:
+                    # a slot is taken before rendering so at most max_inflight pages exist;
+                    # a half-filled batch is sent first rather than waiting on itself
+                    if not slots.acquire(blocking=False):
+                        flush_batch()
+                        slots.acquire()
+                    render_start = time.perf_counter()
+                    try:
+                        i, img = next(page_iter)
+                        report.add(fileName, i, render_s=time.perf_counter() - render_start)
+                    except StopIteration:
+                        slots.release()
+                        flush_batch()
+                        break
+                    except Exception as e:
+                        slots.release()
+                        flush_batch()
+                        print("❌ Conversion failed:", e)
+                        sys.stdout.flush()
+                        return False
+                    kind, ref, signature = page_filter.check(img)
+                    future = Future()
+                    if kind == "new":
+                        batch.append((i, img, future))
+                        page_filter.remember(signature, future)
+                        if len(batch) >= batch_pages:
+                            flush_batch()
+                    elif kind == "blank":
+                        print(f"⬜ {fileName}  Page {i} 為空白頁，略過")
+                        report.add(fileName, i, status="blank")
+                        # a visible marker so a page wrongly taken as blank can be spotted in the docx
+                        future.set_result({"page": i, "text": BLANK_PAGE_TEXT, "ok": True})
+                    else:
+                        print(f"🔁 {fileName}  Page {i} 與先前頁面重複，沿用辨識結果")
+                        report.add(fileName, i, status="duplicate")
+                        ref.add_done_callback(partial(reuse_result, future, i))
+                    future.add_done_callback(lambda _: slots.release())
+                    pending.append(future)
+                    page_count += 1
+                    del img
+                    # journal finished pages in order while the next one renders
+                    while pending and pending[0].done():
+                        result = pending.popleft().result()
+                        record(journal, fileName, result)
+                while pending:
+                    result = pending.popleft().result()
+                    record(journal, fileName, result)
+            journal.sync()
+            elapsed = time.time() - start_time
+            if page_count and elapsed > 0:
+                print(f"⏱️ {fileName}: {page_count} 頁 / {elapsed:.1f} 秒 ({page_count / elapsed * 60:.1f} pages/min, workers={workers}, batch={batch_pages})")
+                print(f"   {ocr_ctx['usage'].describe_since(usage_before, page_count)}")
+                sys.stdout.flush()
 
-        # ---------- If no API key, skip OCR ----------
-        if not APIKey:
-            print("No available API_key found in conf.txt. Skipping AI text extraction.")
+            # ---------- Word File ----------
+            # rebuilt from the journal so resumed pages and new pages are merged in order
+            output_file = os.path.join(OUTPUT_FOLDER, "(未校稿)"+fileName+".docx")
+            with report.timed("docx_s", fileName):
+                build_docx(journal.texts(pages), output_file)
+            print(f"✅ Word file saved: {output_file}\n")
             sys.stdout.flush()
-            return False
+            failed = journal.pending(pages)
+            if failed:
+                # keep the journal so a resume run only redoes the failed pages
+                print(f"⚠️ {fileName}: {len(failed)} 頁辨識失敗 {failed}，可勾選接續上次進度重跑")
+                sys.stdout.flush()
+            else:
+                journal.remove()
+            notify("file_done", file=fileName)
+    finally:
+        rasterizer.close()
+        for tier in tiers:
+            tier.pool.close()
+        ocr_ctx["figure_writer"].shutdown(wait=True)
+        for job in all_jobs:
+            job[3].close()
+
+    report_path = report.write(OUTPUT_FOLDER)
+    print("📊 各階段耗時:")
+    for line in report.summary_lines():
+        print("   " + line)
+    print(f"📊 執行報告: {report_path}")
+    print("📦 " + cache.summary())
+    # a system instruction is still billed as input on every request; only context cache hits are cheaper
+    cached_tokens = ocr_ctx["usage"].cached_tokens
+    if cached_tokens:
+        print(f"🧾 {ocr_ctx['usage'].calls} 次請求中有 {cached_tokens} 個輸入 tokens 來自模型端快取 (以快取價格計費)")
+    elif use_system_instruction:
+        print("🧾 prompt 以 system instruction 傳送，未使用模型端快取，每次請求仍計入完整的輸入 tokens")
+    print("🧹 " + page_filter.summary())
+    if len(tiers) > 1:
+        print("🪜 模型分級統計:")
+        for line in tier_summary(tiers, load_prices(os.path.join(SETTING_FOLDER, "pricing.txt"))):
+            print("   " + line)
+    if len(api_keys) > 1:
+        print("🔑 API key 使用統計:")
+        for tier in tiers:
+            for line in tier.pool.summary_lines():
+                print(f"   {tier.name} {line}")
+    sys.stdout.flush()
+    if options.get("open_output", True):
+        open_folder(OUTPUT_FOLDER)
+    return True
 
-    # ---------- Configure Gemini and perform OCR ----------
-    genai.configure(api_key=APIKey)
-    model = genai.GenerativeModel(gemini_model)
-    print("模型:"+gemini_model)
 
-    for singleimages, pages, fileName in all_jobs:
-        fileName = os.path.splitext(fileName)[0]
-        print(f"----📌Starting text extraction from {fileName}📌----\n")
+def open_folder(path):
+    """用系統的檔案總管開啟資料夾，沒有圖形介面時略過"""
+    try:
+        if sys.platform == "win32":
+            os.startfile(path)
+        elif sys.platform == "darwin":
+            subprocess.Popen(["open", path])
+        elif os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"):
+            subprocess.Popen(["xdg-open", path])
+    except OSError:
+        pass
+
+TEXT_LAYER_REASONS = {
+    "text": "內嵌文字",
+    "image": "含圖片或掃描",
+    "no_text": "文字過少",
+    "broken": "文字層亂碼",
+    "math": "數學式多",
+    "layout": "版面破碎",
+    "unreadable": "無法解析",
+}
+
+
+def describe_reasons(reasons):
+    return "、".join(f"{TEXT_LAYER_REASONS.get(k, k)} {v}" for k, v in reasons.items())
+
+
+def image_source(path):
+    """圖片頁的來源：檔名加內容 hash，檔案增減或被換掉時 resume 不會沿用到別張圖"""
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    return f"{os.path.basename(path)}:{digest}"
+
+def iter_image_pages(image_paths, pages, image_frame):
+    """依序開啟 pages 指定的圖片 (從 1 起算)，一次只解碼一張"""
+    for i in pages:
+        path = image_paths[i - 1]
+        with Image.open(path) as im:
+            img = im.convert("RGB")
+        yield i, draw_black_frame(img) if image_frame else img
+
+BLANK_PAGE_TEXT = "[空白頁]"
+
+def reuse_result(target, page, source):
+    """把重複頁面的結果複製給 target (Future)"""
+    try:
+        target.set_result(dict(source.result(), page=page))
+    except Exception as e:
+        target.set_exception(e)
+
+def distribute_results(futures, pages, job):
+    """
+    把一個請求 (單頁或多頁) 的結果分給各頁的 Future
+    未預期的例外記成這些頁面辨識失敗，不中斷整個執行
+    """
+    try:
+        results = job.result()
+    except Exception as e:
+        print(f"⚠️ 第 {pages} 頁處理失敗: {e}")
         sys.stdout.flush()
-        output_txt = os.path.join(OUTPUT_FOLDER, fileName+"content.txt")
-        with open(output_txt, "w", encoding="utf-8") as f:
-            for i, img in enumerate(singleimages, start=(pages[0] if pages else 1)):
-                print(f"▶️Extracting text from {fileName} page {i}...")
-                sys.stdout.flush()
-                buffer = BytesIO()
-                img.save(buffer, format="PNG")
-                buffer.seek(0)
-                try:
-                    response = model.generate_content([
-                        {"mime_type": "image/png", "data": buffer.getvalue()},
-                        {"text": final_prompt}
-                    ])
-                    text = response.text.strip() if getattr(response, "text", None) else "[No text detected]"
-                    if generate_Img:
-                        extract_figures(img, OUTPUT_FOLDER, f"{fileName}_{i}",min_area, paddling)
-                except Exception as e:
-                    text = f"**********[Error extracting text: {e}]*********"
-                f.write(f"{text}\n\n")
-                print(f"☑️ {fileName}  Page {i} done.")
-                sys.stdout.flush()
-                if slowdown:
-                    print("⚠️降速等待中...")
-                    time.sleep(4)
+        results = [{"page": i, "text": f"**********[Error extracting text: {e}]*********", "ok": False}
+                   for i in pages]
+    if isinstance(results, dict):
+        results = [results]
+    for future, result in zip(futures, results):
+        future.set_result(result)
+
+class TokenUsage:
+    """統計本次執行的模型呼叫次數與 token 用量 (多個 worker 共用)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+
+    def add(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        with self.lock:
+            self.calls += 1
+            self.prompt_tokens += getattr(usage, "prompt_token_count", 0) or 0
+            self.output_tokens += getattr(usage, "candidates_token_count", 0) or 0
+            self.cached_tokens += getattr(usage, "cached_content_token_count", 0) or 0
+
+    def snapshot(self):
+        with self.lock:
+            return self.calls, self.prompt_tokens, self.output_tokens
+
+    def describe_since(self, before, pages):
+        calls, prompt, output = (now - then for now, then in zip(self.snapshot(), before))
+        pages = max(1, pages)
+        return f"模型呼叫 {calls} 次，平均每頁 輸入 {prompt / pages:.0f} / 輸出 {output / pages:.0f} tokens"
+
+def call_model(ctx, tier, parts, est_tokens, fileName, pages):
+    """
+    由 tier 的 key pool 選出 key，在該 key 的限流與重試下呼叫模型，回傳文字
+    模型請求本身、等待限流與重試前等待的秒數分開記錄，和上傳量、token 一起平均記到 pages 的每一頁，
+    重試次數記到每一頁
+    """
+    report = ctx["report"]
+    share = 1 / len(pages)
+    upload_bytes = sum(len(p["data"]) for p in parts if "data" in p)
+
+    def on_retry(error):
+        for i in pages:
+            report.add(fileName, i, retries=1)
+
+    # quota waits and backoff are kept out of request_s so the model latency stays comparable
+    timing = {}
+    try:
+        response, slot = tier.pool.call(parts, est_tokens, on_retry=on_retry, timing=timing)
+    finally:
+        for i in pages:
+            report.add(fileName, i, upload_bytes=upload_bytes * share,
+                       **{field: seconds * share for field, seconds in timing.items()})
+    elapsed = timing["request_s"]
+    usage = getattr(response, "usage_metadata", None)
+    prompt_count = getattr(usage, "prompt_token_count", 0) or 0
+    output_count = getattr(usage, "candidates_token_count", 0) or 0
+    slot.limiter.settle(est_tokens, prompt_count)
+    ctx["usage"].add(response)
+    tier.add_call(elapsed, prompt_count, output_count)
+    for i in pages:
+        report.add(fileName, i, model=tier.name,
+                   prompt_tokens=prompt_count * share, output_tokens=output_count * share)
+    return response.text.strip() if getattr(response, "text", None) else "[No text detected]"
+
+def ask_model(ctx, parts, est_tokens, fileName, i, start_tier=0, outcomes=None):
+    """
+    從 start_tier 開始呼叫模型；請求失敗或輸出沒通過 check_text 時升級到下一級
+    最後一級的輸出不再檢查，請求失敗則把例外拋出
+    outcomes 為 set 時各級的結果 (級數, pages / escalated / errors) 先記在其中，由呼叫端整頁結算
+    """
+    tiers = ctx["tiers"]
 
-        # ---------- Word File ----------
+    def record(level, kind):
+        if outcomes is None:
+            tiers[level].add_result(**{kind: 1})
+        else:
+            outcomes.add((level, kind))
 
-        txt_file = os.path.join(OUTPUT_FOLDER, fileName+"content.txt")
-        if not os.path.exists(txt_file):
-            print(f"❌ File not found: {txt_file}")
-            sys.stdout.flush()
-            return False
+    for level in range(start_tier, len(tiers)):
+        tier = tiers[level]
+        last = level == len(tiers) - 1
+        try:
+            text = call_model(ctx, tier, parts, est_tokens, fileName, [i])
+        except Exception as e:
+            if last:
+                record(level, "errors")
+                raise
+            reason = f"請求失敗 {e}"
+        else:
+            reason = None if last else check_text(text)
+            if reason is None:
+                record(level, "pages")
+                return text
+        record(level, "escalated")
+        print(f"⬆️ {fileName}  Page {i} {tier.name} → {tiers[level + 1].name} ({reason})")
+        sys.stdout.flush()
 
-        with open(txt_file, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+def save_figures(ctx, img, fileName, i):
+    """存出頁面中的圖片，回傳方框 list；沒有勾選輸出圖片或擷取失敗時回傳 []"""
+    if not ctx["generate_Img"]:
+        return []
+    try:
+        with ctx["report"].timed("figures_s", fileName, i):
+            return extract_figures(img, ctx["output_dir"], f"{fileName}_{i}", ctx["min_area"], ctx["paddling"],
+                                   ctx["figure_writer"])
+    except Exception as e:
+        # the page text is still usable without its figures
+        print(f"⚠️ {fileName}  Page {i} 圖片擷取失敗: {e}")
+        sys.stdout.flush()
+        ctx["report"].add(fileName, i, figure_error=str(e))
+        return []
 
-        doc = Document()
+# boxes covering more of the page than this are frames or text blocks, not figures
+MASK_MAX_RATIO = 0.5
+# a box whose ink is at least this much glyph-sized components is framed text (table, boxed question)
+TEXT_INK_RATIO = 0.4
+FIGURE_INSTRUCTION = "圖中以灰框標示的 [FIG n] 是已移除的插圖，請在原本的位置單獨一行輸出相同的 [FIG n]，不要描述圖片內容。\n"
 
-        for line in lines:
-            line = line.rstrip("\n")
-            if not line:
-                doc.add_paragraph("")
-                continue
-            p = doc.add_paragraph()
-            for char in line:
-                run = p.add_run(char)
-                if contains_chinese(char):
-                    run.font.name = "標楷體"
-                    run._element.rPr.rFonts.set(qn("w:eastAsia"), "標楷體")
-                else:
-                    run.font.name = "Times New Roman"
-                    run._element.rPr.rFonts.set(qn("w:eastAsia"), "Times New Roman")
-                    if char.isalpha():  
-                        run.italic = True
-                run.font.size = Pt(12)
-
-        output_file = os.path.join(OUTPUT_FOLDER, "(未校稿)"+fileName+".docx")
-        doc.save(output_file)
-        print(f"✅ Word file saved: {output_file}\n")
-        sys.stdout.flush()
-        os.remove(output_txt)
-    os.startfile(OUTPUT_FOLDER)
-    return True
+def looks_like_text(img, box):
+    """
+    方框內的墨跡大多是字元大小的小區塊時視為文字 (有框線的表格、框起來的題目)
+    圖表與照片的墨跡集中在線條與色塊這類大區塊，只有少量標籤文字
+    """
+    region = np.array(img.crop(box).convert("L"))
+    ink = (region < 160).astype(np.uint8)
+    total = int(ink.sum())
+    if not total:
+        return False
+    count, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    # glyph size follows the page width: about 30 characters across is the largest text
+    glyph = max(12, img.width // 30)
+    small = stats[1:]
+    small = small[(small[:, cv2.CC_STAT_WIDTH] <= glyph) & (small[:, cv2.CC_STAT_HEIGHT] <= glyph)]
+    return int(small[:, cv2.CC_STAT_AREA].sum()) >= total * TEXT_INK_RATIO
+
+def mask_figures(ctx, img, fileName, i):
+    """
+    mask 模式下先存出圖片，再把上傳用副本中的圖片區塊塗白並標上 [FIG n]
+    看起來是文字的區塊 (looks_like_text) 不遮蔽，照常送給模型辨識
+    回傳 (上傳用的圖片, [(n, 圖檔名稱), ...])；不是 mask 模式時回傳 (img, None)
+    """
+    if not ctx["mask_figures"]:
+        return img, None
+    boxes = save_figures(ctx, img, fileName, i)
+    page_area = img.width * img.height
+    figures = [(n, box) for n, box in enumerate(boxes, start=1)
+               if (box[2] - box[0]) * (box[3] - box[1]) <= page_area * MASK_MAX_RATIO
+               and not looks_like_text(img, box)]
+    if not figures:
+        return img, []
+    upload = img.copy()
+    draw = ImageDraw.Draw(upload)
+    for n, (x0, y0, x1, y1) in figures:
+        draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill="white", outline=(128, 128, 128), width=3)
+        label = f"[FIG {n}]"
+        font = ImageFont.load_default(size=max(12, min(48, (y1 - y0) // 3)))
+        left, top, right, bottom = draw.textbbox((0, 0), label, font=font)
+        draw.text(((x0 + x1 - right + left) / 2, (y0 + y1 - bottom + top) / 2), label, fill="black", font=font)
+    ctx["report"].add(fileName, i, masked_figures=len(figures))
+    return upload, [(n, f"{fileName}_{i}_figure_{n}.png") for n, _ in figures]
+
+def link_figures(text, figures):
+    """把模型輸出的 [FIG n] 換成指向圖檔的佔位文字，模型漏掉的補在頁尾"""
+    if not figures:
+        return text
+    for n, name in figures:
+        placeholder = f"*********[缺圖: {name}]*********"
+        text, count = re.subn(rf"\[\s*FIG\s*{n}\s*\]", lambda _: placeholder, text, flags=re.IGNORECASE)
+        if not count:
+            text += "\n" + placeholder
+    return text
+
+def page_failed(ctx, fileName, i, error):
+    """記錄失敗的頁面，回傳該頁的錯誤結果 (不拋出例外，其他頁面照常處理)"""
+    ctx["report"].add(fileName, i, status="error", error=str(error))
+    print(f"☑️ {fileName}  Page {i} done.")
+    sys.stdout.flush()
+    return {"page": i, "text": f"**********[Error extracting text: {error}]*********", "ok": False}
+
+def ocr_page(ctx, img, fileName, i, start_tier=0):
+    """OCR a single page; runs inside the worker pool of process_mainflow."""
+    print(f"▶️Extracting text from {fileName} page {i}...")
+    sys.stdout.flush()
+    report = ctx["report"]
+    try:
+        upload, figures = mask_figures(ctx, img, fileName, i)
+        if ctx.get("tiler") and ctx["tiler"].needs_tiling(upload):
+            return ocr_tiled(ctx, upload, fileName, i, start_tier, figures)
+        with report.timed("encode_s", fileName, i):
+            page_bytes, mime_type, upload_size = encode_page(upload, ctx["encoding"])
+        cache = ctx["cache"]
+        key = cache.make_key(page_bytes, ctx["prompt"], ctx["model_name"])
+        text = cache.get(key)
+        if text is not None:
+            print(f"♻️ {fileName}  Page {i} 使用快取結果")
+            report.add(fileName, i, status="cached")
+        else:
+            parts = [{"mime_type": mime_type, "data": page_bytes}]
+            if figures:
+                parts.append({"text": FIGURE_INSTRUCTION})
+            if ctx["prompt_in_request"]:
+                parts.append({"text": ctx["prompt"]})
+            text = ask_model(ctx, parts, estimate_tokens(ctx["prompt"], upload_size), fileName, i, start_tier)
+            cache.put(key, text)
+            report.add(fileName, i, status="ok")
+    except Exception as e:
+        return page_failed(ctx, fileName, i, e)
+    if figures is None:
+        save_figures(ctx, img, fileName, i)
+    print(f"☑️ {fileName}  Page {i} done.")
+    sys.stdout.flush()
+    return {"page": i, "text": link_figures(text, figures), "ok": True}
+
+def settle_outcomes(tiers, outcomes, ok):
+    """
+    把一頁各段的分級結果合併記一次：完成的頁算在最高的那一級，
+    每一級的升級與錯誤各算一次；整頁失敗時不算完成
+    """
+    done = [level for level, kind in outcomes if kind == "pages"]
+    for level, kind in outcomes:
+        if kind != "pages":
+            tiers[level].add_result(**{kind: 1})
+    if ok and done:
+        tiers[max(done)].add_result(pages=1)
+
+TILE_INSTRUCTION = "這張圖片是一頁長圖由上而下的第 {n}/{count} 段，上下邊緣可能與相鄰段落重疊，請照常轉換圖中的內容。\n"
 
-def extract_figures(image, output_dir, base_name, mina, pad):
+def ocr_tiled(ctx, img, fileName, i, start_tier=0, figures=None):
+    """
+    長圖或過大的頁面切成重疊的橫條，同時辨識後依序接回，重疊處重複的行只保留一次
+    任何一段失敗時整頁視為失敗；figures 不為 None 時 img 已是遮蔽過圖片的上傳副本
+    """
+    report = ctx["report"]
+    cache = ctx["cache"]
+    try:
+        strips = ctx["tiler"].strips(img)
+    except Exception as e:
+        return page_failed(ctx, fileName, i, e)
+    print(f"🧩 {fileName}  Page {i} 切成 {len(strips)} 段辨識")
+    sys.stdout.flush()
+    # strips report their tier results here so the page is counted once
+    outcomes = set()
+
+    def ocr_strip(n, strip):
+        with report.timed("encode_s", fileName, i):
+            strip_bytes, mime_type, upload_size = encode_page(strip, ctx["encoding"])
+        hint = TILE_INSTRUCTION.format(n=n, count=len(strips))
+        key = cache.make_key(strip_bytes, hint + ctx["prompt"], ctx["model_name"])
+        text = cache.get(key)
+        if text is None:
+            parts = [{"text": hint}, {"mime_type": mime_type, "data": strip_bytes}]
+            if figures:
+                parts.append({"text": FIGURE_INSTRUCTION})
+            if ctx["prompt_in_request"]:
+                parts.append({"text": ctx["prompt"]})
+            text = ask_model(ctx, parts, estimate_tokens(ctx["prompt"], upload_size), fileName, i, start_tier,
+                             outcomes)
+            cache.put(key, text)
+        return text
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(len(strips), ctx["tile_workers"])) as pool:
+            texts = list(pool.map(ocr_strip, range(1, len(strips) + 1), strips))
+    except Exception as e:
+        settle_outcomes(ctx["tiers"], outcomes, ok=False)
+        return page_failed(ctx, fileName, i, e)
+    settle_outcomes(ctx["tiers"], outcomes, ok=True)
+    report.add(fileName, i, status="tiled", tiles=len(strips))
+    if figures is None:
+        save_figures(ctx, img, fileName, i)
+    print(f"☑️ {fileName}  Page {i} done.")
+    sys.stdout.flush()
+    return {"page": i, "text": link_figures(stitch(texts), figures), "ok": True}
+
+BATCH_INSTRUCTION = (
+    "以下共有 {count} 張圖片，每張圖片前有一行 <<<PAGE n>>> 標示第幾張。"
+    "請對每一張圖片分別依照轉換規則轉成文字，"
+    "輸出時每一張的內容前都要單獨一行寫上相同的 <<<PAGE n>>>，依序輸出全部 {count} 張，不要合併或省略。\n"
+)
+PAGE_MARK = re.compile(r"^[ \t]*<<<PAGE (\d+)>>>[ \t]*$", re.MULTILINE)
+
+def split_batch(text, count):
+    """依 <<<PAGE n>>> 切回各頁；標記不是剛好 1..count 時回傳 None"""
+    marks = list(PAGE_MARK.finditer(text))
+    if [int(m.group(1)) for m in marks] != list(range(1, count + 1)):
+        return None
+    if text[:marks[0].start()].strip():
+        return None
+    pages = []
+    for k, m in enumerate(marks):
+        end = marks[k + 1].start() if k + 1 < len(marks) else len(text)
+        pages.append(text[m.end():end].strip() or "[No text detected]")
+    return pages
+
+def ocr_batch(ctx, batch, fileName):
+    """
+    一次請求辨識多頁 batch = [(頁碼, 圖片), ...]，回傳每頁的結果
+    回應無法依標記切開或請求失敗時，整批改成逐頁辨識
+    """
+    print(f"▶️Extracting text from {fileName} pages {batch[0][0]}-{batch[-1][0]} (batch)...")
+    sys.stdout.flush()
+    cache = ctx["cache"]
+    texts = {}
+    todo = []
+    report = ctx["report"]
+    tiler = ctx.get("tiler")
+    # tall pages are tiled on their own; escalated pages skip the first tier
+    single = {}
+    masked = {}
+    failed = {}
+    for i, img in batch:
+        if tiler and tiler.needs_tiling(img):
+            single[i] = 0
+            continue
+        try:
+            upload, masked[i] = mask_figures(ctx, img, fileName, i)
+            with report.timed("encode_s", fileName, i):
+                page_bytes, mime_type, upload_size = encode_page(upload, ctx["encoding"])
+        except Exception as e:
+            failed[i] = page_failed(ctx, fileName, i, e)
+            continue
+        key = cache.make_key(page_bytes, ctx["prompt"], ctx["model_name"])
+        text = cache.get(key)
+        if text is not None:
+            texts[i] = text
+            report.add(fileName, i, status="cached")
+        else:
+            todo.append((i, page_bytes, mime_type, upload_size, key))
+
+    if todo:
+        parts = [{"text": BATCH_INSTRUCTION.format(count=len(todo))}]
+        if any(masked[t[0]] for t in todo):
+            parts.append({"text": FIGURE_INSTRUCTION})
+        est_tokens = 0
+        for n, (i, page_bytes, mime_type, upload_size, key) in enumerate(todo, start=1):
+            parts.append({"text": f"<<<PAGE {n}>>>"})
+            parts.append({"mime_type": mime_type, "data": page_bytes})
+            est_tokens += estimate_tokens("", upload_size)
+        if ctx["prompt_in_request"]:
+            parts.append({"text": ctx["prompt"]})
+        try:
+            split = split_batch(call_model(ctx, ctx["tiers"][0], parts, est_tokens + len(ctx["prompt"]),
+                                           fileName, [t[0] for t in todo]), len(todo))
+        except Exception as e:
+            print(f"⚠️ {fileName} 多頁請求失敗 ({e})，改為逐頁辨識")
+            split = None
+        else:
+            if split is None:
+                print(f"⚠️ {fileName} 多頁回應無法依頁切開，改為逐頁辨識")
+        sys.stdout.flush()
+        if split is None:
+            # pages redone one by one save their figures again, which is harmless
+            return [failed[i] if i in failed else ocr_page(ctx, img, fileName, i) for i, img in batch]
+        first = ctx["tiers"][0]
+        for (i, _, _, _, key), text in zip(todo, split):
+            reason = check_text(text) if len(ctx["tiers"]) > 1 else None
+            if reason is not None:
+                # this page alone moves on to the next tier
+                first.add_result(escalated=1)
+                print(f"⬆️ {fileName}  Page {i} {first.name} → {ctx['tiers'][1].name} ({reason})")
+                single[i] = 1
+                continue
+            first.add_result(pages=1)
+            cache.put(key, text)
+            texts[i] = text
+            report.add(fileName, i, status="ok")
+
+    results = []
+    for i, img in batch:
+        if i in failed:
+            results.append(failed[i])
+            continue
+        if i in single:
+            results.append(ocr_page(ctx, img, fileName, i, start_tier=single[i]))
+            continue
+        if masked[i] is None:
+            save_figures(ctx, img, fileName, i)
+        print(f"☑️ {fileName}  Page {i} done.")
+        results.append({"page": i, "text": link_figures(texts[i], masked[i]), "ok": True})
+    sys.stdout.flush()
+    return results
+
+# figures are detected on a copy whose long edge is at most this many pixels,
+# but the short edge keeps at least FIGURE_DETECT_SHORT_EDGE so text lines of tall pages stay apart
+FIGURE_DETECT_LONG_EDGE = 1000
+FIGURE_DETECT_SHORT_EDGE = 700
+
+def extract_figures(image, output_dir, base_name, mina, pad, writer=None):
+    """
+    找出頁面中面積大於 mina 的圖形區塊，向外延伸 pad 後存成 png
+    偵測在縮小的圖上進行，重疊或相距 pad 以內的區塊會合併成一張
+    writer 為 executor 時由背景 thread 寫檔；回傳 [(x0, y0, x1, y1), ...]
+    """
     os.makedirs(output_dir, exist_ok=True)
 
     img = np.array(image.convert("RGB"))
+    height, width = img.shape[:2]
     img_gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
 
+    scale = min(1.0, max(FIGURE_DETECT_LONG_EDGE / max(width, height),
+                         FIGURE_DETECT_SHORT_EDGE / min(width, height)))
+    if scale < 1.0:
+        img_gray = cv2.resize(img_gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
     _, thresh = cv2.threshold(img_gray, 240, 255, cv2.THRESH_BINARY_INV)
 
     contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
 
     boxes = []
-    debug_img = img.copy()
-
-    for i, cnt in enumerate(contours):
+    for cnt in contours:
         x, y, w, h = cv2.boundingRect(cnt)
+        # map back to full resolution before the area check
+        x, y, w, h = (int(v / scale) for v in (x, y, w, h))
         if w * h < mina:
             continue
-
-        boxes.append({"x": int(x), "y": int(y), "width": int(w), "height": int(h)})
-
-        cv2.rectangle(debug_img, (x, y), (x + w, y + h), (255, 0, 0), 2)
-
-        roi = img[y-pad:y+h+pad, x-pad:x+w+pad]
+        boxes.append((x, y, x + w, y + h))
+
+    boxes = merge_boxes(boxes, pad)
+    boxes.sort(key=lambda b: (b[1], b[0]))
+
+    crops = []
+    for i, (x0, y0, x1, y1) in enumerate(boxes):
+        x0, y0 = max(0, x0 - pad), max(0, y0 - pad)
+        x1, y1 = min(width, x1 + pad), min(height, y1 + pad)
+        crops.append((x0, y0, x1, y1))
+        # copy so the queued crop does not keep the whole page alive
+        roi = img[y0:y1, x0:x1].copy()
         out_path = os.path.join(output_dir, f"{base_name}_figure_{i+1}.png")
-        Image.fromarray(roi).save(out_path)
-        print(f"📸 已輸出輔助圖片: {out_path}")
-        sys.stdout.flush()
+        if writer is not None:
+            writer.submit(save_figure, roi, out_path)
+        else:
+            save_figure(roi, out_path)
+    return crops
+
+def merge_boxes(boxes, gap):
+    """合併重疊或相距 gap 以內的方框，直到沒有可合併的為止"""
+    boxes = [list(b) for b in boxes]
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for b in boxes:
+            for m in result:
+                if b[0] <= m[2] + gap and m[0] <= b[2] + gap and b[1] <= m[3] + gap and m[1] <= b[3] + gap:
+                    m[0], m[1] = min(m[0], b[0]), min(m[1], b[1])
+                    m[2], m[3] = max(m[2], b[2]), max(m[3], b[3])
+                    merged = True
+                    break
+            else:
+                result.append(b)
+        boxes = result
+    return [tuple(b) for b in boxes]
+
+def save_figure(roi, out_path):
+    Image.fromarray(roi).save(out_path)
+    print(f"📸 已輸出輔助圖片: {out_path}")
+    sys.stdout.flush()
 
 # ---------- Read configuration ----------
 def read_conf(file_path):
@@ -239,6 +920,13 @@ def read_conf(file_path):
                 config[key.strip()] = value.strip().strip('"')
     return config
             
+def poppler_dir(config):
+    """conf.txt 的 poppler_path；預設值是 Windows 的安裝位置，不存在時改用 PATH 上的 poppler"""
+    poppler_path = (config or {}).get("poppler_path")
+    if poppler_path and not os.path.isdir(poppler_path):
+        return None
+    return poppler_path
+
 def read_prompt(file_path,mode):
     with open(file_path, "r", encoding="utf-8") as f:
         if not os.path.exists(file_path):
@@ -249,7 +937,3 @@ def read_prompt(file_path,mode):
             return  "另外，我還需要:"+txt_cont
         else:
             return txt_cont
-
-    
-def contains_chinese(char):
-    return '\u4e00' <= char <= '\u9fff'
\ No newline at end of file
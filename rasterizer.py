@@ -0,0 +1,97 @@
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pdf2image import convert_from_path
+from PIL import ImageDraw
+
+
+def draw_black_frame(img):
+    draw = ImageDraw.Draw(img)
+    w, h = img.size
+    thickness = 10
+    draw.rectangle([0, 0, w-1, h-1], outline="black", width=thickness)
+    return img
+
+
+def render_chunk(pdf_path, first_page, last_page, dpi, poppler_path, image_frame):
+    """在子行程中把 first_page ~ last_page 轉成圖片"""
+    images = convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        fmt="png",
+        poppler_path=poppler_path,
+        first_page=first_page,
+        last_page=last_page,
+    )
+    if image_frame:
+        images = [draw_black_frame(img) for img in images]
+    return images
+
+
+def split_chunks(pages, chunk_size):
+    """把頁碼切成最多 chunk_size 頁、且頁碼連續的區塊"""
+    chunks = []
+    for page in pages:
+        if chunks and len(chunks[-1]) < chunk_size and chunks[-1][-1] + 1 == page:
+            chunks[-1].append(page)
+        else:
+            chunks.append([page])
+    return chunks
+
+
+class ParallelRasterizer:
+    """
+    用 process pool 平行轉檔：每個 PDF 的頁碼範圍切成 chunk_size 頁一塊，
+    所有檔案的 chunk 依序送進 pool，最多同時 max_chunks 塊在處理或等待取用。
+    iter_pages() 依頁碼順序取出某個檔案的頁面，每塊完成就立刻交給 OCR。
+    """
+
+    def __init__(self, poppler_path, dpi=200, processes=0, chunk_size=4, max_chunks=0):
+        self.poppler_path = poppler_path
+        self.dpi = dpi
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = max(1, chunk_size)
+        self.max_chunks = max_chunks or self.processes * 2
+        self.executor = ProcessPoolExecutor(max_workers=self.processes)
+        self.queue = deque()
+        self.futures = {}
+
+    def add(self, pdf_path, pages, image_frame=False):
+        """登記一個檔案要轉的頁碼"""
+        for chunk in split_chunks(pages, self.chunk_size):
+            self.queue.append((pdf_path, chunk[0], chunk[-1], image_frame))
+        self._fill()
+
+    def _fill(self):
+        while self.queue and len(self.futures) < self.max_chunks:
+            pdf_path, first, last, image_frame = self.queue.popleft()
+            self.futures[(pdf_path, first)] = self.executor.submit(
+                render_chunk, pdf_path, first, last, self.dpi, self.poppler_path, image_frame
+            )
+
+    def iter_pages(self, pdf_path, pages):
+        """依序 yield (頁碼, 圖片)，chunk 完成前會阻塞"""
+        name = os.path.basename(pdf_path)
+        print(f"📄 Converting {name} pages to images... ({self.processes} processes)")
+        sys.stdout.flush()
+        for chunk in split_chunks(pages, self.chunk_size):
+            first = chunk[0]
+            # files are consumed in the order they were added, so the oldest
+            # submitted chunk is always the one asked for here
+            images = self.futures.pop((pdf_path, first)).result()
+            self._fill()
+            page = first
+            while images:
+                # hand pages over one by one so the chunk does not outlive them
+                yield page, images.pop(0)
+                page += 1
+        print(f"✅ All selected pages in {name} have been successfully converted.\n")
+        sys.stdout.flush()
+
+    def close(self):
+        self.queue.clear()
+        for future in self.futures.values():
+            future.cancel()
+        self.futures.clear()
+        self.executor.shutdown(wait=True)
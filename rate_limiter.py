@@ -0,0 +1,164 @@
+import os
+import re
+import random
+import threading
+import time
+
+# Free-tier quotas; override per model in setting/ratelimit.txt
+DEFAULT_RPM = 10
+DEFAULT_TPM = 250000
+
+RETRYABLE_CODES = {429, 500, 503, 504}
+AUTH_CODES = {401, 403}
+
+
+class TokenBucket:
+    """每分鐘補充 rate 個 token 的 token bucket，容量預設為一分鐘的量"""
+
+    def __init__(self, rate_per_min, capacity=None):
+        self.rate = rate_per_min / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_min)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """回傳還要等多久才能取出 amount 個 token"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        # may go negative: the debt is paid back by later refills
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """同一個模型共用的 RPM / TPM 限流器，可被多個 worker thread 同時使用"""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def try_acquire(self, est_tokens):
+        """可以立即送出時取出配額並回傳 0，否則回傳還要等待的秒數"""
+        with self.lock:
+            now = time.monotonic()
+            wait = max(
+                self.paused_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(est_tokens, now),
+            )
+            if wait <= 0:
+                self.requests.consume(1)
+                self.tokens.consume(est_tokens)
+                return 0.0
+            return wait
+
+    def acquire(self, est_tokens):
+        """阻塞直到可以再送出一個預估 est_tokens 的請求"""
+        while True:
+            wait = self.try_acquire(est_tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def settle(self, est_tokens, actual_tokens):
+        """以 response 回報的實際 token 數修正先前的預估"""
+        if not actual_tokens:
+            return
+        with self.lock:
+            self.tokens.consume(actual_tokens - est_tokens)
+
+    def pause(self, seconds):
+        """收到 429 時讓所有 worker 一起暫停"""
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def load_rate_limits(file_path):
+    """
+    讀取 ratelimit.txt，每行格式為 "model: rpm, tpm"；
+    個別 key 的配額不同時可寫成 "model@key 末四碼: rpm, tpm"
+    回傳 {model: (rpm, tpm)}
+    """
+    limits = {}
+    if not os.path.exists(file_path):
+        return limits
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if ":" not in line:
+                continue
+            model, value = line.split(":", 1)
+            try:
+                rpm, tpm = (int(v) for v in value.split(","))
+            except ValueError:
+                continue
+            limits[model.strip()] = (rpm, tpm)
+    return limits
+
+
+def build_limiter(model_name, file_path, slowdown=False, api_key=""):
+    limits = load_rate_limits(file_path)
+    rpm, tpm = limits.get(f"{model_name}@{api_key[-4:]}") or limits.get(model_name, (DEFAULT_RPM, DEFAULT_TPM))
+    if slowdown:
+        # 降速模式只用一半的配額
+        rpm, tpm = max(1, rpm // 2), max(1, tpm // 2)
+    return RateLimiter(rpm, tpm)
+
+
+def error_code(error):
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    match = re.match(r"\s*(\d{3})\s", str(error))
+    return int(match.group(1)) if match else None
+
+
+def is_retryable(error):
+    if error_code(error) in RETRYABLE_CODES:
+        return True
+    message = str(error).lower()
+    return "quota" in message or "rate limit" in message or "deadline" in message
+
+
+def is_auth_error(error):
+    """key 無效、被停用或沒有權限"""
+    if error_code(error) in AUTH_CODES:
+        return True
+    message = str(error).lower()
+    return "api key not valid" in message or "api_key_invalid" in message or "permission denied" in message
+
+
+def retry_after_seconds(error):
+    """從錯誤內容取出伺服器建議的等待秒數，沒有則回傳 None"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after:
+        return float(retry_after)
+    message = str(error)
+    for pattern in (r"retry in ([\d.]+)\s*s", r"retry_delay\s*\{\s*seconds:\s*(\d+)", r"retry-after:\s*([\d.]+)"):
+        match = re.search(pattern, message, re.IGNORECASE)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt, base=2.0, cap=60.0):
+    """jittered exponential backoff：第 n 次重試等待 base/2 ~ base*2^(n+1) 秒之間的隨機值"""
+    return random.uniform(base / 2, min(cap, base * 2 ** (attempt + 1)))
+
+
+def estimate_tokens(prompt, image_size):
+    """粗估一次請求的輸入 token：Gemini 將圖片切成 768x768 的 tile，每個 258 tokens"""
+    w, h = image_size
+    tiles = max(1, -(-w // 768)) * max(1, -(-h // 768))
+    return len(prompt) + 258 * tiles
@@ -0,0 +1,130 @@
+import csv
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# per-page numeric fields, in report column order
+PAGE_FIELDS = [
+    "render_s", "encode_s", "request_s", "quota_wait_s", "backoff_s", "figures_s",
+    "upload_bytes", "prompt_tokens", "output_tokens", "retries", "tiles", "masked_figures",
+]
+SUMMARY_FIELDS = ["render_s", "encode_s", "request_s", "quota_wait_s", "backoff_s", "figures_s", "upload_bytes"]
+
+
+def percentile(values, q):
+    """nearest-rank 百分位數"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = max(0, min(len(values) - 1, math.ceil(q / 100 * len(values)) - 1))
+    return values[k]
+
+
+class RunReport:
+    """
+    收集一次執行中每頁、每個檔案各階段的耗時與用量，結束時寫成 JSON / CSV
+    多個 worker thread 可同時呼叫
+    """
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.pages = {}     # (file, page) -> {field: value}
+        self.files = {}     # file -> {field: value}
+
+    def add(self, file, page, **values):
+        """數值欄位累加，其他欄位 (error, status...) 直接覆寫"""
+        with self.lock:
+            rec = self.pages.setdefault((file, page), {"file": file, "page": page})
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    rec[key] = rec.get(key, 0) + value
+                else:
+                    rec[key] = value
+
+    def add_file(self, file, **values):
+        with self.lock:
+            rec = self.files.setdefault(file, {"file": file})
+            for key, value in values.items():
+                rec[key] = rec.get(key, 0) + value
+
+    @contextmanager
+    def timed(self, field, file, page=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if page is None:
+                self.add_file(file, **{field: elapsed})
+            else:
+                self.add(file, page, **{field: elapsed})
+
+    def failed_pages(self):
+        """回傳辨識失敗的 (file, page)"""
+        with self.lock:
+            return sorted(k for k, r in self.pages.items() if r.get("status") == "error")
+
+    def summary(self):
+        """回傳每個階段的 count / p50 / p95 / total"""
+        with self.lock:
+            rows = list(self.pages.values())
+        result = {}
+        for field in PAGE_FIELDS:
+            values = [r[field] for r in rows if field in r]
+            if values:
+                result[field] = {
+                    "count": len(values),
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                    "total": sum(values),
+                }
+        return result
+
+    def summary_lines(self):
+        stats = self.summary()
+        lines = []
+        for field in SUMMARY_FIELDS:
+            if field not in stats:
+                continue
+            s = stats[field]
+            if field.endswith("_s"):
+                lines.append(f"{field:<13} p50 {s['p50']:6.2f}s  p95 {s['p95']:6.2f}s  合計 {s['total']:8.1f}s ({s['count']} 頁)")
+            else:
+                lines.append(f"{field:<13} p50 {s['p50'] / 1024:6.0f}KB p95 {s['p95'] / 1024:6.0f}KB 合計 {s['total'] / 1024 / 1024:8.1f}MB")
+        with self.lock:
+            rows = list(self.pages.values())
+            docx_s = sum(f.get("docx_s", 0) for f in self.files.values())
+        retries = sum(r.get("retries", 0) for r in rows)
+        errors = sum(1 for r in rows if r.get("error"))
+        tokens = sum(r.get("prompt_tokens", 0) + r.get("output_tokens", 0) for r in rows)
+        lines.append(f"docx_s 合計 {docx_s:.1f}s，重試 {retries} 次，錯誤 {errors} 頁，tokens {tokens:.0f}")
+        return lines
+
+    def write(self, output_dir):
+        """寫出 run_report_<時間>.json 與 .csv，回傳 json 路徑"""
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started))
+        base = os.path.join(output_dir, f"run_report_{stamp}")
+        with self.lock:
+            pages = sorted(self.pages.values(), key=lambda r: (r["file"], r["page"]))
+            files = list(self.files.values())
+        report = {
+            "model": self.model_name,
+            "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started)),
+            "wall_s": round(time.time() - self.started, 3),
+            "summary": self.summary(),
+            "files": files,
+            "pages": pages,
+        }
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        columns = ["file", "page", "status", "model"] + PAGE_FIELDS + ["error", "figure_error"]
+        with open(base + ".csv", "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(pages)
+        return base + ".json"
@@ -0,0 +1,94 @@
+import re
+import unicodedata
+from PyPDF2 import PdfReader
+
+# characters that usually mean the text layer is broken or the font has no unicode map
+BROKEN_CHARS = re.compile(r"[�-]|\(cid:\d+\)")
+
+
+def has_images(page):
+    """頁面 (含 Form XObject 內) 是否有點陣圖"""
+    def walk(resources, depth):
+        if resources is None or depth > 3:
+            return False
+        xobjects = resources.get_object().get("/XObject")
+        if xobjects is None:
+            return False
+        for ref in xobjects.get_object().values():
+            obj = ref.get_object()
+            subtype = obj.get("/Subtype")
+            if subtype == "/Image":
+                return True
+            if subtype == "/Form" and walk(obj.get("/Resources"), depth + 1):
+                return True
+        return False
+
+    return walk(page.get("/Resources"), 0)
+
+
+def math_ratio(text):
+    """數學符號與希臘字母佔非空白字元的比例"""
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return 0.0
+    math = sum(1 for c in chars if unicodedata.category(c) == "Sm" or "Ͱ" <= c <= "Ͽ")
+    return math / len(chars)
+
+
+def clean_text(text):
+    lines = [line.rstrip() for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+class TextLayer:
+    """
+    讀取 PDF 內嵌的文字層，判斷每頁是否可以不經 OCR 直接使用
+    以下情況仍交給模型：頁面有點陣圖 (掃描檔或含圖片)、文字少於 min_chars、
+    亂碼比例高於 max_broken、數學符號比例高於 max_math、
+    非空白行平均少於 min_line_chars 字 (每個字各自一行之類的版面，直接寫成 Word 會一字一段)
+    """
+
+    def __init__(self, min_chars=50, max_broken=0.02, max_math=0.03, min_line_chars=12):
+        self.min_chars = min_chars
+        self.max_broken = max_broken
+        self.max_math = max_math
+        self.min_line_chars = min_line_chars
+
+    def classify(self, page):
+        """回傳 (可用的文字或 None, 原因)"""
+        if has_images(page):
+            return None, "image"
+        try:
+            text = clean_text(page.extract_text() or "")
+        except Exception:
+            return None, "unreadable"
+        chars = len(re.sub(r"\s", "", text))
+        if chars < self.min_chars:
+            return None, "no_text"
+        if len(BROKEN_CHARS.findall(text)) / chars > self.max_broken:
+            return None, "broken"
+        if math_ratio(text) > self.max_math:
+            return None, "math"
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        if sum(len(line) for line in lines) / len(lines) < self.min_line_chars:
+            return None, "layout"
+        return text, "text"
+
+    def extract(self, pdf_path, pages):
+        """
+        回傳 ({頁碼: 文字}, {原因: 頁數})，只包含可以直接使用文字層的頁面
+        PDF 無法解析時全部交給 OCR
+        """
+        texts = {}
+        reasons = {}
+        try:
+            with open(pdf_path, "rb") as f:
+                reader = PdfReader(f)
+                for page_no in pages:
+                    text, reason = self.classify(reader.pages[page_no - 1])
+                    reasons[reason] = reasons.get(reason, 0) + 1
+                    if text is not None:
+                        texts[page_no] = text
+        except Exception:
+            return {}, {"unreadable": len(pages)}
+        return texts, reasons
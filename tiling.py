@@ -0,0 +1,97 @@
+import re
+import numpy as np
+from PIL import Image
+
+# row profiles are computed on a copy this wide
+PROFILE_WIDTH = 400
+# pixels darker than this count as ink
+INK_LEVEL = 160
+# a cut is searched for in the last part of each strip, from this fraction of its height
+SEARCH_FROM = 0.6
+# an overlap is only dropped when its lines carry at least this many content characters
+MIN_OVERLAP_CHARS = 10
+# latex commands, environment delimiters and punctuation do not count as content
+NON_CONTENT = re.compile(r"\\(?:begin|end)\{[^}]*\}|\\[A-Za-z]+|[\W_]")
+
+
+class Tiler:
+    """
+    把長截圖或過大的頁面切成數段橫條分別辨識：
+    - 高寬比超過 max_aspect 或像素數超過 max_pixels 的圖片才切
+    - 每段高度約為 min(寬 * max_aspect, max_pixels / 寬)，切點選在該段後段墨水最少的空白列
+    - 相鄰兩段上下各重疊 overlap 像素，避免切到文字；重複的行在 stitch() 時去掉
+    """
+
+    def __init__(self, max_aspect=2.0, max_pixels=12_000_000, overlap=60):
+        self.max_aspect = max_aspect
+        self.max_pixels = max_pixels
+        self.overlap = overlap
+
+    def needs_tiling(self, img):
+        w, h = img.size
+        return h > w * self.max_aspect or w * h > self.max_pixels
+
+    def row_profile(self, img):
+        """每一列的墨水像素數 (以原圖的列為單位)"""
+        w, h = img.size
+        scale = min(1.0, PROFILE_WIDTH / w)
+        small = img.convert("L").resize((max(1, round(w * scale)), h), Image.BOX)
+        return (np.asarray(small) < INK_LEVEL).sum(axis=1)
+
+    def find_cut(self, profile, start, end):
+        """在 [start, end) 中找墨水最少且最長的空白區段，回傳其中點"""
+        window = profile[start:end]
+        low = window.min()
+        best_len, best_mid, run = 0, end, 0
+        for k, value in enumerate(window):
+            if value <= low:
+                run += 1
+                if run > best_len:
+                    best_len, best_mid = run, start + k - run // 2
+            else:
+                run = 0
+        return best_mid
+
+    def split(self, img):
+        """回傳 [(top, bottom), ...]，不需要切時只有一段"""
+        w, h = img.size
+        if not self.needs_tiling(img):
+            return [(0, h)]
+        strip = int(min(w * self.max_aspect, self.max_pixels / w))
+        strip = max(strip, self.overlap * 4)
+        profile = self.row_profile(img)
+        cuts = [0]
+        while h - cuts[-1] > strip:
+            top = cuts[-1]
+            cuts.append(self.find_cut(profile, top + int(strip * SEARCH_FROM), top + strip))
+        cuts.append(h)
+        return [(max(0, top - self.overlap), min(h, bottom + self.overlap))
+                for top, bottom in zip(cuts, cuts[1:])]
+
+    def strips(self, img):
+        return [img.crop((0, top, img.width, bottom)) for top, bottom in self.split(img)]
+
+
+def stitch(texts, max_overlap_lines=8):
+    """
+    依序接起各段的文字；後一段開頭與前一段結尾相同的行 (重疊區) 只保留一次
+    比對時忽略前後空白；相同的行合計少於 MIN_OVERLAP_CHARS 個內容字元時不視為重疊，
+    避免把 $$、\\end{aligned}、(A) 這類本來就會重複出現的行刪掉
+    """
+    lines = []
+    for text in texts:
+        new = text.strip().splitlines()
+        tail = [line.strip() for line in lines[-max_overlap_lines:] if line.strip()]
+        head = [line.strip() for line in new[:max_overlap_lines * 2]]
+        skip = 0
+        for k in range(min(len(tail), max_overlap_lines), 0, -1):
+            if tail[-k:] == [line for line in head if line][:k]:
+                if sum(len(NON_CONTENT.sub("", line)) for line in tail[-k:]) >= MIN_OVERLAP_CHARS:
+                    skip = k
+                break
+        # drop the first `skip` non-blank lines of the new strip
+        while skip and new:
+            if new.pop(0).strip():
+                skip -= 1
+        lines.extend(new)
+    return "\n".join(lines).strip()
@@ -1,19 +1,38 @@
 import sys
 import os
+import threading
+from collections import deque
 
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLabel, QLineEdit, QPushButton, QMessageBox, QCheckBox, QTextEdit
+    QLabel, QLineEdit, QPushButton, QMessageBox, QCheckBox, QTextEdit, QProgressBar
 )
-from PyQt5.QtCore import QObject, Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QThread, QTimer, pyqtSignal
 from load_content_manager import APIKeyManager
 from load_content_manager import ModelManager
 from pdf_loader import PDFLoader
-from process_main import process_mainflow
+
+# lines kept in the log view; older lines are dropped
+LOG_MAX_LINES = 5000
+# pending log lines are moved into the view at this interval
+LOG_FLUSH_MS = 100
+# process_main (cv2, genai, pdf2image, docx...) is imported when a run starts,
+# or preloaded in the background once the window is up
+
+
+def preload_modules():
+    """在背景載入辨識流程用到的套件，按下執行時不必再等"""
+    try:
+        import process_main
+        import google.generativeai
+    except Exception:
+        # a missing package surfaces with a proper message when the run starts
+        pass
 
 
 class ProcessThread(QThread):
     finished = pyqtSignal(bool)
+    progress = pyqtSignal(object)
     
     def __init__(self, api_key, pdf_dict, options,minarea_val, paddling_val, addition_prompt, selected_model):
         super().__init__()
@@ -26,18 +45,50 @@ class ProcessThread(QThread):
         self.selected_model = selected_model
         
     def run(self):
-        success = process_mainflow(self.api_key, self.pdf_dict, self.options,self.minarea_val,self.paddling_val,self.addition_prompt, self.selected_model)
+        from process_main import process_mainflow
+        success = process_mainflow(self.api_key, self.pdf_dict, self.options,self.minarea_val,self.paddling_val,self.addition_prompt, self.selected_model,
+                                   progress=self.progress.emit)
         self.finished.emit(success)
 
-class EmittingStream(QObject):
-    new_text = pyqtSignal(str)
+class PageCountThread(QThread):
+    counted = pyqtSignal(str, int)
 
-    def __init__(self):
+    def __init__(self, pdf_loader, pdf_files):
         super().__init__()
+        self.pdf_loader = pdf_loader
+        self.pdf_files = pdf_files
+
+    def run(self):
+        for name, pages in self.pdf_loader.iter_page_counts(self.pdf_files):
+            self.counted.emit(name, pages)
+
+class EmittingStream:
+    """
+    取代 sys.stdout / sys.stderr：print 的文字先放進固定長度的 ring buffer，
+    由 UI 的 timer 定期一次取出，不會每次 print 都觸發 UI 更新
+    """
+
+    def __init__(self, max_lines=LOG_MAX_LINES):
+        self.lines = deque(maxlen=max_lines)
+        self.lock = threading.Lock()
+        self.partial = {}       # thread id -> unfinished line
 
     def write(self, text):
-        if text.strip():
-            self.new_text.emit(text)
+        thread = threading.get_ident()
+        with self.lock:
+            # print() writes the text and the newline in separate calls, and OCR workers
+            # print at the same time, so each thread keeps its own unfinished line
+            *complete, rest = (self.partial.pop(thread, "") + text).split("\n")
+            if rest:
+                self.partial[thread] = rest
+            self.lines.extend(line for line in complete if line.strip())
+
+    def drain(self):
+        """取出目前累積的完整行"""
+        with self.lock:
+            lines = list(self.lines)
+            self.lines.clear()
+        return lines
 
     def flush(self):
         pass
@@ -94,12 +145,13 @@ class MainWindow(QMainWindow):
         font.setFamily("Consolas")
         font.setPointSize(12)
         self.log_box.setFont(font)
-        self.stdout_stream = EmittingStream()
-        self.stderr_stream = EmittingStream()
-        self.stdout_stream.new_text.connect(self.append_log)
-        self.stderr_stream.new_text.connect(self.append_log)
-        sys.stdout = self.stdout_stream
-        sys.stderr = self.stderr_stream
+        self.log_box.document().setMaximumBlockCount(LOG_MAX_LINES)
+        self.log_stream = EmittingStream()
+        sys.stdout = self.log_stream
+        sys.stderr = self.log_stream
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.flush_log)
+        self.log_timer.start(LOG_FLUSH_MS)
 
         self.key_manager = APIKeyManager()
         self.model_manager = ModelManager()
@@ -121,6 +173,7 @@ class MainWindow(QMainWindow):
         self.key_input = QLineEdit()
         self.key_input.setFixedWidth(700)
         self.key_input.setText(self.key_manager.read_key())
+        self.key_input.setPlaceholderText("多把 key 以逗號分隔，請求會分散到各 key 的配額")
         row.addWidget(self.key_input)
 
         self.save_button = QPushButton("更新")
@@ -152,6 +205,14 @@ class MainWindow(QMainWindow):
         
         black_frame_row.addSpacing(25) 
 
+        self.resume_label = QLabel("接續上次進度")
+        self.resume_enable = QCheckBox("")
+        self.resume_enable.setChecked(False)
+        black_frame_row.addWidget(self.resume_enable)
+        black_frame_row.addWidget(self.resume_label)
+
+        black_frame_row.addSpacing(25) 
+
         self.crop_label = QLabel("輔助圖片輸出(")
         self.crop_enable = QCheckBox("")
         self.crop_enable.setChecked(False)
@@ -172,6 +233,14 @@ class MainWindow(QMainWindow):
         self.paddling.setText("60")
         black_frame_row.addWidget(self.paddling)
         black_frame_row.addWidget(QLabel(")"))
+
+        black_frame_row.addSpacing(10) 
+
+        self.mask_label = QLabel("上傳前遮蔽圖片")
+        self.mask_enable = QCheckBox("")
+        self.mask_enable.setChecked(False)
+        black_frame_row.addWidget(self.mask_enable)
+        black_frame_row.addWidget(self.mask_label)
         
         black_frame_row.addStretch()
         main_layout.addLayout(black_frame_row)
@@ -208,6 +277,14 @@ class MainWindow(QMainWindow):
             self.selected_model = None 
             for item in self.models_controls:
                 item["enable"].stateChanged.connect(self.on_model_checked)
+
+            routing_row = QHBoxLayout()
+            self.routing_enable = QCheckBox("")
+            self.routing_enable.setChecked(False)
+            routing_row.addWidget(self.routing_enable)
+            routing_row.addWidget(QLabel("自動分級(先用較快的模型，失敗才升級到所選模型)"))
+            routing_row.addStretch()
+            model_section.addLayout(routing_row)
             main_layout.addLayout(model_section)
             main_layout.addWidget(QLabel(""))
         # =======================================================
@@ -256,6 +333,12 @@ class MainWindow(QMainWindow):
         # execution button
         # =========================
         bottom_row = QHBoxLayout()
+        self.progress_label = QLabel("")
+        bottom_row.addWidget(self.progress_label)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setFormat("%v / %m 頁")
+        self.progress_bar.setVisible(False)
+        bottom_row.addWidget(self.progress_bar, 1)
         bottom_row.addStretch()  
 
         self.run_button = QPushButton("開始執行")
@@ -266,6 +349,8 @@ class MainWindow(QMainWindow):
         main_layout.addLayout(bottom_row)
 
         self.setCentralWidget(central)
+        # runs once the event loop starts, i.e. after the window is shown
+        QTimer.singleShot(0, lambda: threading.Thread(target=preload_modules, daemon=True).start())
 
 
     def save_api_key(self):
@@ -273,11 +358,38 @@ class MainWindow(QMainWindow):
         self.key_manager.write_key(new_key)
         QMessageBox.information(self, "成功", "API Key 更新")
 
-    def append_log(self, text):
-        self.log_box.append(text)
-        self.log_box.verticalScrollBar().setValue(
-            self.log_box.verticalScrollBar().maximum()
-        )
+    def flush_log(self):
+        lines = self.log_stream.drain()
+        if not lines:
+            return
+        bar = self.log_box.verticalScrollBar()
+        # only follow the output when the view is already at the bottom
+        at_bottom = bar.value() >= bar.maximum() - 4
+        self.log_box.append("\n".join(lines))
+        if at_bottom:
+            bar.setValue(bar.maximum())
+
+    def on_progress(self, event):
+        kind = event["type"]
+        if kind == "run_start":
+            self.progress_bar.setRange(0, max(1, event["pages"]))
+            self.progress_bar.setValue(0)
+            self.progress_bar.setVisible(True)
+            self.progress_state = {"files": event["files"], "index": 0, "file": "",
+                                   "pages": 0, "done": 0, "failed": 0}
+            return
+        state = self.progress_state
+        if kind == "file_start":
+            state.update(index=event["index"], file=event["file"], pages=event["pages"], done=0)
+        elif kind == "page_done":
+            self.progress_bar.setValue(self.progress_bar.value() + 1)
+            state["done"] += 1
+            state["failed"] += 0 if event["ok"] else 1
+        else:
+            return
+        failed = f"，失敗 {state['failed']} 頁" if state["failed"] else ""
+        self.progress_label.setText(
+            f"檔案 {state['index']}/{state['files']} {state['file']}: {state['done']}/{state['pages']} 頁{failed}")
 
     def count_images(self):
         input_dir = "input"
@@ -292,9 +404,9 @@ class MainWindow(QMainWindow):
         )
 
     def build_pdf_section(self, layout):
-        pdf_info_list = self.pdf_loader.get_pdf_info()
+        pdf_files = self.pdf_loader.list_pdfs()
 
-        if not pdf_info_list:
+        if not pdf_files:
             return
 
         title_row = QHBoxLayout()
@@ -302,14 +414,16 @@ class MainWindow(QMainWindow):
 
         self.pdf_controls = []
 
-        for info in pdf_info_list:
+        # rows are built from cached counts; uncached PDFs are counted in the background
+        for name in pdf_files:
+            pages = self.pdf_loader.cached_pages(name)
             row = QHBoxLayout()
 
             chk = QCheckBox()
             chk.setChecked(True)
             row.addWidget(chk)
 
-            row.addWidget(QLabel("📄"+info["name"]))
+            row.addWidget(QLabel("📄"+name))
 
             row.addWidget(QLabel("從"))
             start_input = QLineEdit()
@@ -321,21 +435,35 @@ class MainWindow(QMainWindow):
             end_input.setFixedWidth(50)
             row.addWidget(end_input)
 
-            row.addWidget(QLabel(f"(共 {info['pages']} 頁)"))
+            pages_label = QLabel(f"(共 {pages} 頁)" if pages is not None else "(計算頁數中…)")
+            row.addWidget(pages_label)
 
             row.addStretch()
             layout.addLayout(row)
 
             self.pdf_controls.append(
                 {
-                    "name": info["name"],
-                    "pages": info["pages"],
+                    "name": name,
+                    "pages": pages,
+                    "pages_label": pages_label,
                     "enable": chk,
                     "start": start_input,
                     "end": end_input
                 }
             )
 
+        missing = [item["name"] for item in self.pdf_controls if item["pages"] is None]
+        if missing:
+            self.page_count_thread = PageCountThread(self.pdf_loader, missing)
+            self.page_count_thread.counted.connect(self.on_page_counted)
+            self.page_count_thread.start()
+
+    def on_page_counted(self, name, pages):
+        for item in self.pdf_controls:
+            if item["name"] == name:
+                item["pages"] = pages
+                item["pages_label"].setText(f"(共 {pages} 頁)")
+
     def on_run_clicked(self):
         api_key = self.key_input.text().strip()
         addition_prompt = self.prompt_txt.toPlainText().strip() 
@@ -348,6 +476,9 @@ class MainWindow(QMainWindow):
         for item in self.pdf_controls:
             if not item["enable"].isChecked():
                 continue
+            if item["pages"] is None:
+                QMessageBox.warning(self, "錯誤", f"{item['name']} 頁數計算中，請稍候")
+                return
             try:
                 start = int(item["start"].text())
                 end = int(item["end"].text())
@@ -380,7 +511,10 @@ class MainWindow(QMainWindow):
             "transcribe": self.enable_transcribe.isChecked(),
             "black_frame": self.frame_enable.isChecked(),
             "crop": self.crop_enable.isChecked(),
-            "slowdown": self.slowdown_enable.isChecked()
+            "slowdown": self.slowdown_enable.isChecked(),
+            "resume": self.resume_enable.isChecked(),
+            "mask_figures": self.mask_enable.isChecked(),
+            "routing": self.routing_enable.isChecked()
         }
 
         pdf_file_start_end_dict = {}
@@ -396,9 +530,11 @@ class MainWindow(QMainWindow):
         self.run_button.setEnabled(False)  
         self.thread = ProcessThread(api_key, pdf_file_start_end_dict, options,self.minarea_val, self.paddling_val, addition_prompt, self.selected_model)
         self.thread.finished.connect(self.on_process_finished)
+        self.thread.progress.connect(self.on_progress)
         self.thread.start()
 
     def on_process_finished(self, success):
+        self.flush_log()
         if success:
             QMessageBox.information(self, "完成", "PDF 處理完成！")
             self.close()
@@ -0,0 +1,198 @@
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import struct
+import sys
+import time
+
+WATCH_EXTS = (".pdf", ".png", ".jpg", ".jpeg")
+
+# linux/inotify.h
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Inotify:
+    """以 ctypes 呼叫 Linux inotify，只監看單一資料夾"""
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def read(self, timeout):
+        """
+        等待事件最多 timeout 秒 (None 為不限)，回傳變動的檔名 set
+        沒有事件時回傳空 set；事件佇列溢位時回傳 None，表示需要整個資料夾重新掃描
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        data = os.read(self.fd, 64 * 1024)
+        names = set()
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            if mask & IN_Q_OVERFLOW:
+                return None
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    監看 input 資料夾，找出新增或內容變更的檔案
+    state_file 記錄每個檔案的 (大小, 修改時間)、sha256 與是否已處理；
+    大小與修改時間沒變的檔案不重新計算 hash，內容相同的檔案不會再處理一次
+    Linux 使用 inotify，其他平台或 inotify 無法使用時每 poll_interval 秒比對一次大小與修改時間
+    處理失敗的檔案只在每 rescan_s 秒一次的整個資料夾重新掃描時重試
+    """
+
+    def __init__(self, input_dir, state_file, poll_interval=5.0, settle_s=2.0, rescan_s=600.0):
+        self.input_dir = input_dir
+        self.state_file = state_file
+        self.poll_interval = poll_interval
+        self.settle_s = settle_s
+        self.rescan_s = rescan_s
+        self.state = self._load_state()
+        self.unsettled = set()      # files still being written
+        self.last_full_scan = 0.0
+        self.notifier = None
+        if sys.platform.startswith("linux"):
+            try:
+                self.notifier = Inotify(input_dir)
+            except OSError as e:
+                print(f"⚠️ 無法使用 inotify，改為每 {poll_interval:g} 秒掃描 ({e})")
+                sys.stdout.flush()
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self):
+        os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+        tmp = self.state_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp, self.state_file)
+
+    def scan(self, names=None):
+        """
+        檢查 names (None 為整個資料夾重新掃描)，回傳需要處理的檔名 list
+        剛寫入不到 settle_s 秒的檔案先略過，稍後再檢查；
+        沒有變動但還沒處理完成 (先前失敗) 的檔案只在重新掃描時再處理
+        """
+        now = time.time()
+        retry = names is None
+        if names is None:
+            self.last_full_scan = now
+            try:
+                names = set(os.listdir(self.input_dir))
+            except OSError:
+                return []
+            names |= set(self.state)
+        names = set(names) | self.unsettled
+        self.unsettled = set()
+
+        changed = []
+        for name in sorted(names):
+            if not name.lower().endswith(WATCH_EXTS):
+                continue
+            path = os.path.join(self.input_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                self.state.pop(name, None)
+                continue
+            if now - st.st_mtime < self.settle_s:
+                self.unsettled.add(name)
+                continue
+            stat = [st.st_size, st.st_mtime_ns]
+            rec = self.state.get(name)
+            if rec and rec["stat"] == stat:
+                if not rec["done"] and retry:
+                    changed.append(name)
+                continue
+            try:
+                digest = file_hash(path)
+            except OSError:
+                self.unsettled.add(name)
+                continue
+            if rec and rec["sha256"] == digest and rec["done"]:
+                # touched or copied over with the same content
+                rec["stat"] = stat
+                continue
+            self.state[name] = {"stat": stat, "sha256": digest, "done": False}
+            changed.append(name)
+        self.save_state()
+        return changed
+
+    def mark_done(self, names):
+        for name in names:
+            if name in self.state:
+                self.state[name]["done"] = True
+        self.save_state()
+
+    def wait(self):
+        """
+        等到資料夾可能有變動，回傳要檢查的檔名 set，None 表示整個資料夾重新掃描
+        連續的事件會等安靜 settle_s 秒後一起回傳
+        """
+        if time.time() - self.last_full_scan >= self.rescan_s:
+            # also retries files that failed earlier
+            return None
+        if self.notifier is None:
+            time.sleep(self.poll_interval)
+            # only size / mtime changes are picked up between rescans
+            try:
+                return set(os.listdir(self.input_dir)) | set(self.state)
+            except OSError:
+                return set()
+        timeout = self.settle_s if self.unsettled else self.rescan_s
+        names = self.notifier.read(timeout)
+        while names:
+            more = self.notifier.read(self.settle_s)
+            if more is None:
+                return None
+            if not more:
+                break
+            names |= more
+        return names
+
+    def close(self):
+        if self.notifier is not None:
+            self.notifier.close()
+            self.notifier = None